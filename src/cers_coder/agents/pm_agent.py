@@ -4,15 +4,70 @@ PM智能体 - 项目管理智能体，负责任务分解、进度控制和智能
 
 import asyncio
 import logging
+import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 
 from ..core.base_agent import AgentCapability, AgentConfig, BaseAgent
 from ..core.file_parser import FileParser, ProjectRequirements
 from ..core.message import Message, MessageType, create_task_message
 from ..core.operation_recorder import OperationRecorder, OperationType
 from ..core.state_manager import StateManager
-from ..core.workflow import TaskDefinition, WorkflowController, WorkflowPhase
+from ..core.workflow import (
+    TaskDefinition,
+    WorkflowController,
+    WorkflowPhase,
+    batch_topsort,
+)
+
+# 时间戳缓存：同一毫秒内复用已格式化的时间字符串
+_timestamp_bucket: int = 0
+_timestamp_value: str = ""
+
+
+def _now_isoformat() -> str:
+    """获取当前时间的ISO格式字符串（毫秒级缓存）"""
+    global _timestamp_bucket, _timestamp_value
+    now = time.time()
+    bucket = int(now * 1000)
+    if bucket != _timestamp_bucket:
+        _timestamp_bucket = bucket
+        _timestamp_value = datetime.fromtimestamp(now).isoformat()
+    return _timestamp_value
+
+
+# PM智能体配置模板（每个实例使用深拷贝，实例间互不影响）
+_PM_AGENT_CONFIG = AgentConfig(
+    name="PM智能体",
+    description="项目管理智能体，负责任务分解、进度控制和智能体协调",
+    capabilities=[AgentCapability.MANAGEMENT],
+    max_concurrent_tasks=5,
+    timeout=600
+)
+
+# 默认任务计划阶段：(名称, 工期, 交付物)，不可变，使用时构建新的字典
+_TASK_PLAN_PHASES: Tuple[Tuple[str, str, Tuple[str, ...]], ...] = (
+    ("需求分析", "1-2天", ("需求文档", "功能模型")),
+    ("架构设计", "2-3天", ("架构图", "接口定义")),
+    ("代码开发", "5-10天", ("源代码", "单元测试")),
+    ("测试验证", "2-3天", ("测试报告", "bug修复")),
+    ("构建部署", "1-2天", ("构建脚本", "部署配置")),
+    ("文档生成", "1-2天", ("API文档", "用户手册")),
+    ("最终审查", "1天", ("审查报告", "优化建议")),
+)
+_TASK_PLAN_DURATION = "13-23天"
+
+
+# 简化的自动审批规则：审批类型 -> 判定函数
+_APPROVAL_RULES: Mapping[str, Callable[[Dict[str, Any]], bool]] = MappingProxyType({
+    # 架构变更需要更严格的审批
+    "architecture_change": lambda details: False,
+    # 代码审查通常自动通过
+    "code_review": lambda details: True,
+    # 部署需要检查测试结果
+    "deployment": lambda details: details.get("test_passed", False),
+})
 
 
 class PMAgent(BaseAgent):
@@ -20,29 +75,74 @@ class PMAgent(BaseAgent):
 
     def __init__(self, state_manager: StateManager, workflow_controller: WorkflowController,
                  operation_recorder: Optional[OperationRecorder] = None):
-        config = AgentConfig(
-            name="PM智能体",
-            description="项目管理智能体，负责任务分解、进度控制和智能体协调",
-            capabilities=[AgentCapability.MANAGEMENT],
-            max_concurrent_tasks=5,
-            timeout=600
-        )
-        super().__init__(config, operation_recorder)
+        super().__init__(_PM_AGENT_CONFIG.model_copy(deep=True), operation_recorder)
+        self._sender_name = self.name
 
         self.state_manager = state_manager
         self.workflow_controller = workflow_controller
         self.file_parser = FileParser()
 
         # PM状态
-        self.project_requirements: Optional[ProjectRequirements] = None
+        self._project_requirements: Optional[ProjectRequirements] = None
+        self._requirements_dump: Optional[Dict[str, Any]] = None
         self.current_phase = WorkflowPhase.INITIALIZATION
         self.task_progress: Dict[str, float] = {}
 
+        # 待写入的智能体状态（合并高频进度上报，延迟批量写入）
+        self.agent_update_delay = 0.1
+        self._pending_agent_updates: Dict[str, Dict[str, Any]] = {}
+        self._agent_update_task: Optional[asyncio.Task] = None
+
+        # 任务处理并发控制
+        self._task_semaphore = asyncio.Semaphore(self.config.max_concurrent_tasks)
+        self._waiting_tasks = 0
+
+        # 消息分发表
+        self._task_handlers = {
+            "initialize_project": self._handle_initialize_project,
+            "parse_requirements": self._handle_parse_requirements,
+            "create_workflow": self._handle_create_workflow,
+            "monitor_progress": self._handle_monitor_progress,
+        }
+        self._request_handlers = {
+            "get_requirements": self._handle_get_requirements,
+            "report_progress": self._handle_report_progress,
+            "request_approval": self._handle_request_approval,
+        }
+
+    def _reply(self, message: Message, subject: str, content: Dict[str, Any]) -> Message:
+        """以本智能体身份回复消息"""
+        return message.create_reply(sender=self._sender_name, subject=subject, content=content)
+
+    @property
+    def project_requirements(self) -> Optional[ProjectRequirements]:
+        """项目需求"""
+        return self._project_requirements
+
+    @project_requirements.setter
+    def project_requirements(self, requirements: Optional[ProjectRequirements]) -> None:
+        self._project_requirements = requirements
+        self._requirements_dump = None
+
+    @property
+    def requirements_payload(self) -> Dict[str, Any]:
+        """项目需求的序列化结果（缓存，需求重新赋值时失效）"""
+        if self._requirements_dump is None and self._project_requirements is not None:
+            self._requirements_dump = self._project_requirements.model_dump()
+        return self._requirements_dump or {}
+
     async def _initialize(self) -> None:
         """初始化PM智能体"""
         self.logger.info("PM智能体初始化")
         await self._load_project_state()
 
+    async def _cleanup(self) -> None:
+        """清理PM智能体"""
+        if self._agent_update_task:
+            self._agent_update_task.cancel()
+            self._agent_update_task = None
+        await self._write_agent_updates()
+
     async def _load_project_state(self) -> None:
         """加载项目状态"""
         current_state = self.state_manager.get_current_state()
@@ -57,34 +157,27 @@ class PMAgent(BaseAgent):
     async def _handle_task_create(self, message: Message) -> Optional[Message]:
         """处理任务创建消息"""
         task_type = message.content.get("task_type", "")
-        
-        if task_type == "initialize_project":
-            return await self._handle_initialize_project(message)
-        elif task_type == "parse_requirements":
-            return await self._handle_parse_requirements(message)
-        elif task_type == "create_workflow":
-            return await self._handle_create_workflow(message)
-        elif task_type == "monitor_progress":
-            return await self._handle_monitor_progress(message)
-        else:
-            return await self._handle_generic_task(message)
+        handler = self._task_handlers.get(task_type, self._handle_generic_task)
+
+        # 限制同时执行的任务数量，超出的任务排队等待
+        self._waiting_tasks += 1
+        waiting = True
+        try:
+            async with self._task_semaphore:
+                self._waiting_tasks -= 1
+                waiting = False
+                return await handler(message)
+        finally:
+            if waiting:
+                self._waiting_tasks -= 1
 
     async def _handle_agent_request(self, message: Message) -> Optional[Message]:
         """处理智能体请求消息"""
         request_type = message.content.get("request_type", "")
-        
-        if request_type == "get_requirements":
-            return await self._handle_get_requirements(message)
-        elif request_type == "report_progress":
-            return await self._handle_report_progress(message)
-        elif request_type == "request_approval":
-            return await self._handle_request_approval(message)
-        else:
-            return message.create_reply(
-                sender=self.name,
-                subject="未知请求类型",
-                content={"error": f"未知请求类型: {request_type}"}
-            )
+        handler = self._request_handlers.get(request_type)
+        if handler is None:
+            return self._reply(message, "未知请求类型", {"error": f"未知请求类型: {request_type}"})
+        return await handler(message)
 
     async def _handle_initialize_project(self, message: Message) -> Optional[Message]:
         """处理项目初始化"""
@@ -97,14 +190,16 @@ class PMAgent(BaseAgent):
             if missing_files:
                 error_msg = f"缺少必需文件: {', '.join(missing_files)}"
                 self.logger.error(error_msg)
-                return message.create_reply(
-                    sender=self.name,
-                    subject="项目初始化失败",
-                    content={"error": error_msg, "missing_files": missing_files}
+                return self._reply(
+                    message,
+                    "项目初始化失败",
+                    {"error": error_msg, "missing_files": missing_files}
                 )
             
-            # 提取项目需求
-            self.project_requirements = await self.file_parser.extract_requirements(parsed_files)
+            # 提取项目需求和输入文件内容
+            self.project_requirements, input_files = (
+                await self.file_parser.extract_requirements_and_inputs(parsed_files)
+            )
             
             # 验证需求完整性
             validation_issues = self.file_parser.validate_requirements(self.project_requirements)
@@ -118,52 +213,40 @@ class PMAgent(BaseAgent):
             )
             
             # 保存需求信息到状态
-            project_state.requirements = self.project_requirements.model_dump()
-            project_state.input_files = {
-                filename: content.content 
-                for filename, content in parsed_files.items() 
-                if content.exists
-            }
+            project_state.requirements = self.requirements_payload
+            project_state.input_files = input_files
             await self.state_manager.save_state()
             
             self.logger.info(f"项目初始化完成: {self.project_requirements.name}")
             
-            return message.create_reply(
-                sender=self.name,
-                subject="项目初始化完成",
-                content={
+            return self._reply(
+                message,
+                "项目初始化完成",
+                {
                     "project_name": self.project_requirements.name,
                     "project_id": project_state.id,
-                    "requirements": self.project_requirements.model_dump(),
+                    "requirements": self.requirements_payload,
                     "validation_issues": validation_issues
                 }
             )
             
         except Exception as e:
             self.logger.error(f"项目初始化失败: {e}", exc_info=True)
-            return message.create_reply(
-                sender=self.name,
-                subject="项目初始化失败",
-                content={"error": str(e)}
-            )
+            return self._reply(message, "项目初始化失败", {"error": str(e)})
 
     async def _handle_parse_requirements(self, message: Message) -> Optional[Message]:
         """处理需求解析"""
         if not self.project_requirements:
-            return message.create_reply(
-                sender=self.name,
-                subject="需求解析失败",
-                content={"error": "项目未初始化"}
-            )
+            return self._reply(message, "需求解析失败", {"error": "项目未初始化"})
         
         # 分析需求并生成任务计划
         task_plan = await self._create_task_plan()
         
-        return message.create_reply(
-            sender=self.name,
-            subject="需求解析完成",
-            content={
-                "requirements": self.project_requirements.model_dump(),
+        return self._reply(
+            message,
+            "需求解析完成",
+            {
+                "requirements": self.requirements_payload,
                 "task_plan": task_plan
             }
         )
@@ -173,38 +256,39 @@ class PMAgent(BaseAgent):
         try:
             # 创建工作流任务
             tasks = await self._create_detailed_workflow()
-            
-            # 将任务添加到工作流控制器
+
+            # 任务已由 create_default_workflow 注册到工作流控制器，这里只按依赖层级分批用于展示
+            waves = batch_topsort(tasks)
+
+            # 收集阶段和任务摘要
+            phases: Dict[str, None] = {}
+            task_summaries = []
             for task in tasks:
-                self.workflow_controller.tasks[task.id] = task
-            
-            self.logger.info(f"创建工作流，包含 {len(tasks)} 个任务")
+                phase = task.phase.value
+                phases[phase] = None
+                task_summaries.append({
+                    "id": task.id,
+                    "name": task.name,
+                    "phase": phase,
+                    "agent_type": task.agent_type
+                })
+
+            self.logger.info(f"创建工作流，包含 {len(tasks)} 个任务，{len(waves)} 个批次")
             
-            return message.create_reply(
-                sender=self.name,
-                subject="工作流创建完成",
-                content={
+            return self._reply(
+                message,
+                "工作流创建完成",
+                {
                     "task_count": len(tasks),
-                    "phases": list(set(task.phase.value for task in tasks)),
-                    "tasks": [
-                        {
-                            "id": task.id,
-                            "name": task.name,
-                            "phase": task.phase.value,
-                            "agent_type": task.agent_type
-                        }
-                        for task in tasks
-                    ]
+                    "phases": list(phases),
+                    "tasks": task_summaries,
+                    "waves": [[task.id for task in wave] for wave in waves]
                 }
             )
             
         except Exception as e:
             self.logger.error(f"创建工作流失败: {e}", exc_info=True)
-            return message.create_reply(
-                sender=self.name,
-                subject="工作流创建失败",
-                content={"error": str(e)}
-            )
+            return self._reply(message, "工作流创建失败", {"error": str(e)})
 
     async def _handle_monitor_progress(self, message: Message) -> Optional[Message]:
         """处理进度监控"""
@@ -216,26 +300,14 @@ class PMAgent(BaseAgent):
             current_state.update_progress(workflow_status["progress"])
             await self.state_manager.save_state()
         
-        return message.create_reply(
-            sender=self.name,
-            subject="进度报告",
-            content=workflow_status
-        )
+        return self._reply(message, "进度报告", workflow_status)
 
     async def _handle_get_requirements(self, message: Message) -> Optional[Message]:
         """处理获取需求请求"""
         if not self.project_requirements:
-            return message.create_reply(
-                sender=self.name,
-                subject="需求信息",
-                content={"error": "项目需求未加载"}
-            )
+            return self._reply(message, "需求信息", {"error": "项目需求未加载"})
         
-        return message.create_reply(
-            sender=self.name,
-            subject="需求信息",
-            content={"requirements": self.project_requirements.model_dump()}
-        )
+        return self._reply(message, "需求信息", {"requirements": self.requirements_payload})
 
     async def _handle_report_progress(self, message: Message) -> Optional[Message]:
         """处理进度报告"""
@@ -250,14 +322,28 @@ class PMAgent(BaseAgent):
             self.task_progress[task_id] = progress
             self.logger.info(f"更新任务进度: {task_id} -> {progress}%")
         
-        # 更新智能体状态
-        await self.state_manager.update_agent_status(agent_name, progress_data)
+        # 合并智能体状态，由后台任务延迟写入
+        self._pending_agent_updates[agent_name] = progress_data
+        if self._agent_update_task is None:
+            self._agent_update_task = asyncio.create_task(self._flush_agent_updates())
         
-        return message.create_reply(
-            sender=self.name,
-            subject="进度已记录",
-            content={"status": "acknowledged"}
-        )
+        return self._reply(message, "进度已记录", {"status": "acknowledged"})
+
+    async def _flush_agent_updates(self) -> None:
+        """延迟后批量写入智能体状态"""
+        await asyncio.sleep(self.agent_update_delay)
+        self._agent_update_task = None
+        await self._write_agent_updates()
+
+    async def _write_agent_updates(self) -> None:
+        """写入待处理的智能体状态"""
+        if not self._pending_agent_updates:
+            return
+        updates, self._pending_agent_updates = self._pending_agent_updates, {}
+        try:
+            await self.state_manager.update_agents_status(updates)
+        except Exception as e:
+            self.logger.error(f"写入智能体状态失败: {e}", exc_info=True)
 
     async def _handle_request_approval(self, message: Message) -> Optional[Message]:
         """处理审批请求"""
@@ -267,10 +353,10 @@ class PMAgent(BaseAgent):
         # 简化的自动审批逻辑
         approved = await self._evaluate_approval_request(approval_type, details)
         
-        return message.create_reply(
-            sender=self.name,
-            subject="审批结果",
-            content={
+        return self._reply(
+            message,
+            "审批结果",
+            {
                 "approved": approved,
                 "approval_type": approval_type,
                 "reason": "自动审批" if approved else "需要人工审核"
@@ -281,52 +367,36 @@ class PMAgent(BaseAgent):
         """处理通用任务"""
         self.logger.info(f"处理通用任务: {message.subject}")
         
-        # 记录任务
-        task_info = {
-            "id": str(message.id),
-            "name": message.subject,
-            "description": message.content.get("description", ""),
-            "sender": message.sender,
-            "created_at": datetime.now().isoformat()
-        }
-        
+        message_id = message.str_id
+
+        # 有当前项目时记录任务
         current_state = self.state_manager.get_current_state()
         if current_state:
+            task_info = {
+                "id": message_id,
+                "name": message.subject,
+                "description": message.content.get("description", ""),
+                "sender": message.sender,
+                "created_at": _now_isoformat()
+            }
             await self.state_manager.add_task(task_info)
         
-        return message.create_reply(
-            sender=self.name,
-            subject="任务已接收",
-            content={"task_id": str(message.id), "status": "acknowledged"}
-        )
+        return self._reply(message, "任务已接收", {"task_id": message_id, "status": "acknowledged"})
 
     async def _create_task_plan(self) -> Dict[str, Any]:
         """创建任务计划"""
         if not self.project_requirements:
             return {}
         
-        plan = {
-            "phases": [],
-            "estimated_duration": "待评估",
+        return {
+            "phases": [
+                {"name": name, "duration": duration, "deliverables": list(deliverables)}
+                for name, duration, deliverables in _TASK_PLAN_PHASES
+            ],
+            "estimated_duration": _TASK_PLAN_DURATION,
             "key_milestones": [],
             "risk_factors": []
         }
-        
-        # 根据需求分析创建阶段计划
-        phases = [
-            {"name": "需求分析", "duration": "1-2天", "deliverables": ["需求文档", "功能模型"]},
-            {"name": "架构设计", "duration": "2-3天", "deliverables": ["架构图", "接口定义"]},
-            {"name": "代码开发", "duration": "5-10天", "deliverables": ["源代码", "单元测试"]},
-            {"name": "测试验证", "duration": "2-3天", "deliverables": ["测试报告", "bug修复"]},
-            {"name": "构建部署", "duration": "1-2天", "deliverables": ["构建脚本", "部署配置"]},
-            {"name": "文档生成", "duration": "1-2天", "deliverables": ["API文档", "用户手册"]},
-            {"name": "最终审查", "duration": "1天", "deliverables": ["审查报告", "优化建议"]}
-        ]
-        
-        plan["phases"] = phases
-        plan["estimated_duration"] = "13-23天"
-        
-        return plan
 
     async def _create_detailed_workflow(self) -> List[TaskDefinition]:
         """创建详细的工作流任务"""
@@ -353,20 +423,9 @@ class PMAgent(BaseAgent):
 
     async def _evaluate_approval_request(self, approval_type: str, details: Dict[str, Any]) -> bool:
         """评估审批请求"""
-        # 简化的审批逻辑
-        if approval_type == "architecture_change":
-            # 架构变更需要更严格的审批
-            return False
-        elif approval_type == "code_review":
-            # 代码审查通常自动通过
-            return True
-        elif approval_type == "deployment":
-            # 部署需要检查测试结果
-            test_passed = details.get("test_passed", False)
-            return test_passed
-        else:
-            # 默认需要人工审核
-            return False
+        # 未登记的审批类型默认需要人工审核
+        rule = _APPROVAL_RULES.get(approval_type)
+        return bool(rule(details)) if rule else False
 
     def get_project_overview(self) -> Dict[str, Any]:
         """获取项目概览"""
@@ -385,5 +444,6 @@ class PMAgent(BaseAgent):
             "completed_tasks": workflow_status.get("completed_tasks", 0),
             "running_tasks": workflow_status.get("running_tasks", 0),
             "agents_count": len(self.workflow_controller.agents),
+            "waiting_tasks": self._waiting_tasks,
             "last_updated": current_state.updated_at.isoformat() if current_state else None
         }
@@ -2,21 +2,90 @@
 需求分析智能体 - 负责结构化提取业务需求，生成功能模型
 """
 
-import json
+import asyncio
+import hashlib
 import logging
+import re
+import string
+from collections import OrderedDict
+from contextlib import aclosing
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from itertools import islice
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
-from pydantic import BaseModel, Field
+import orjson
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 from ..core.base_agent import AgentCapability, AgentConfig, BaseAgent
 from ..core.message import Message, MessageType
 from ..core.operation_recorder import OperationRecorder, OperationType
 from ..llm.ollama_client import OllamaClient
 
+# 包含规则/约束关键词的整行
+_RULE_LINE_RE = re.compile(r"(?m)^[^\n]*(?:规则|必须|应该)[^\n]*$")
+_CONSTRAINT_LINE_RE = re.compile(r"(?m)^[^\n]*(?:约束|限制|不能|禁止)[^\n]*$")
+# 同时需要规则和约束时，一次扫描取出候选行后再分类
+_KEYWORD_LINE_RE = re.compile(r"(?m)^[^\n]*(?:规则|必须|应该|约束|限制|不能|禁止)[^\n]*$")
+_RULE_KEYWORD_RE = re.compile(r"规则|必须|应该")
+_CONSTRAINT_KEYWORD_RE = re.compile(r"约束|限制|不能|禁止")
+
+# 超过该大小（字符数）的文件在线程中扫描规则
+_THREAD_SCAN_MIN_SIZE = 32 * 1024
+
+# LLM提示词模板，$files 为格式化后的项目文档
+_PROMPT_OVERVIEW = string.Template("""\
+基于以下项目文档，分析项目概览：
+
+$files
+
+请以JSON对象格式返回，包含以下字段：
+- domain: 项目所属的业务领域（如：电商、金融、教育、医疗、工具软件等），简洁回答
+- scope: 用1-2句话概括项目的主要功能范围
+- target_users: 简洁描述项目的主要目标用户
+""")
+
+_PROMPT_FUNCTIONAL_REQUIREMENTS = string.Template("""\
+基于以下项目文档，提取功能需求。请以JSON格式返回，包含以下字段：
+- id: 需求唯一标识
+- name: 需求名称
+- description: 详细描述
+- priority: 优先级（高/中/低）
+- category: 需求类别
+- acceptance_criteria: 验收标准列表
+
+项目文档：
+$files
+
+请返回JSON数组格式的功能需求列表。
+""")
+
+_PROMPT_NON_FUNCTIONAL_REQUIREMENTS = string.Template("""\
+基于以下项目文档，识别非功能需求（性能、安全、可用性、可扩展性等）。
+请以JSON格式返回，包含以下字段：
+- id: 需求唯一标识
+- name: 需求名称
+- description: 详细描述
+- category: 类别（性能/安全/可用性/可扩展性等）
+- metrics: 度量标准列表
+- constraints: 约束条件列表
+
+项目文档：
+$files
+
+请返回JSON数组格式的非功能需求列表。
+""")
+
+# 基于功能需求生成用例时使用的固定模板
+_UC_FLOW_TEMPLATE = ("1. 用户访问系统", "2. 用户执行{name}操作", "3. 系统处理请求", "4. 系统返回结果")
+_UC_PRECONDITIONS = ("用户已登录系统",)
+_UC_POSTCONDITIONS = ("操作完成",)
+_UC_MAX_COUNT = 5
+
 
 class FunctionalRequirement(BaseModel):
     """功能需求模型"""
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     id: str = Field(..., description="需求ID")
     name: str = Field(..., description="需求名称")
     description: str = Field(..., description="需求描述")
@@ -29,6 +98,8 @@ class FunctionalRequirement(BaseModel):
 
 class NonFunctionalRequirement(BaseModel):
     """非功能需求模型"""
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     id: str = Field(..., description="需求ID")
     name: str = Field(..., description="需求名称")
     description: str = Field(..., description="需求描述")
@@ -39,6 +110,8 @@ class NonFunctionalRequirement(BaseModel):
 
 class UseCase(BaseModel):
     """用例模型"""
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     id: str = Field(..., description="用例ID")
     name: str = Field(..., description="用例名称")
     actor: str = Field(..., description="参与者")
@@ -52,6 +125,8 @@ class UseCase(BaseModel):
 
 class RequirementAnalysisResult(BaseModel):
     """需求分析结果"""
+    model_config = ConfigDict(extra="ignore")
+
     project_overview: Dict[str, str] = Field(default_factory=dict, description="项目概览")
     functional_requirements: List[FunctionalRequirement] = Field(default_factory=list, description="功能需求")
     non_functional_requirements: List[NonFunctionalRequirement] = Field(default_factory=list, description="非功能需求")
@@ -63,10 +138,35 @@ class RequirementAnalysisResult(BaseModel):
     glossary: Dict[str, str] = Field(default_factory=dict, description="术语表")
 
 
+# 列表校验器（一次校验整个LLM返回的列表）
+_FUNCTIONAL_REQUIREMENTS = TypeAdapter(List[FunctionalRequirement])
+_NON_FUNCTIONAL_REQUIREMENTS = TypeAdapter(List[NonFunctionalRequirement])
+
+
 class RequirementAgent(BaseAgent):
     """需求分析智能体"""
 
+    __slots__ = ("ollama_client", "analysis_result", "llm_cache_size", "_llm_cache", "_inflight")
+
+    # 消息分发表：类型 -> 处理方法名（调用时解析，子类可覆盖对应方法）
+    _TASK_HANDLERS = {
+        "analyze_requirements": "_analyze_requirements",
+        "extract_functional_requirements": "_extract_functional_requirements",
+        "create_use_cases": "_create_use_cases",
+        "validate_requirements": "_validate_requirements",
+    }
+    _REQUEST_HANDLERS = {
+        "get_analysis_result": "_get_analysis_result",
+        "get_requirements_summary": "_get_requirements_summary",
+    }
+
     def __init__(self, ollama_client: OllamaClient, operation_recorder: Optional[OperationRecorder] = None):
+        """初始化需求分析智能体
+
+        分析过程中会并发发送多个LLM请求。Ollama服务端需设置 OLLAMA_NUM_PARALLEL
+        （单个模型可并行处理的请求数）才能真正并行执行，否则请求会在服务端排队；
+        OLLAMA_MAX_LOADED_MODELS 控制同时加载的模型数量。
+        """
         config = AgentConfig(
             name="需求分析智能体",
             description="负责结构化提取业务需求，生成功能模型和用例",
@@ -84,35 +184,29 @@ class RequirementAgent(BaseAgent):
         self.ollama_client = ollama_client
         self.analysis_result: Optional[RequirementAnalysisResult] = None
 
+        # LLM响应缓存（LRU）
+        self.llm_cache_size = 128
+        self._llm_cache: OrderedDict[str, str] = OrderedDict()
+        # 进行中的LLM请求，相同请求并发时共享同一结果
+        self._inflight: Dict[str, asyncio.Future[Optional[str]]] = {}
+
     async def _handle_task_create(self, message: Message) -> Optional[Message]:
         """处理任务创建消息"""
         task_type = message.content.get("task_type", "")
-        
-        if task_type == "analyze_requirements":
-            return await self._analyze_requirements(message)
-        elif task_type == "extract_functional_requirements":
-            return await self._extract_functional_requirements(message)
-        elif task_type == "create_use_cases":
-            return await self._create_use_cases(message)
-        elif task_type == "validate_requirements":
-            return await self._validate_requirements(message)
-        else:
-            return await self._handle_generic_analysis(message)
+        handler = getattr(self, self._TASK_HANDLERS.get(task_type, "_handle_generic_analysis"))
+        return await handler(message)
 
     async def _handle_agent_request(self, message: Message) -> Optional[Message]:
         """处理智能体请求消息"""
         request_type = message.content.get("request_type", "")
-        
-        if request_type == "get_analysis_result":
-            return await self._get_analysis_result(message)
-        elif request_type == "get_requirements_summary":
-            return await self._get_requirements_summary(message)
-        else:
+        handler_name = self._REQUEST_HANDLERS.get(request_type)
+        if handler_name is None:
             return message.create_reply(
                 sender=self.name,
                 subject="未知请求类型",
                 content={"error": f"未知请求类型: {request_type}"}
             )
+        return await getattr(self, handler_name)(message)
 
     async def _analyze_requirements(self, message: Message) -> Optional[Message]:
         """分析需求"""
@@ -126,20 +220,16 @@ class RequirementAgent(BaseAgent):
             # 初始化分析结果
             self.analysis_result = RequirementAnalysisResult()
             
-            # 分析项目概览
-            await self._analyze_project_overview(project_data, input_files)
-            
-            # 提取功能需求
-            await self._extract_functional_requirements_from_data(input_files)
-            
-            # 提取非功能需求
-            await self._extract_non_functional_requirements(input_files)
-            
-            # 生成用例
-            await self._generate_use_cases()
+            # 格式化输入文件（所有提示词共用）
+            formatted_files = self._format_input_files(input_files)
             
-            # 识别业务规则和约束
-            await self._identify_business_rules_and_constraints(input_files)
+            # 概览、功能需求（及其用例）、非功能需求、业务规则互不依赖，并发执行
+            await asyncio.gather(
+                self._analyze_project_overview(project_data, formatted_files),
+                self._extract_functional_requirements_and_use_cases(formatted_files),
+                self._extract_non_functional_requirements(formatted_files),
+                self._identify_business_rules_and_constraints(input_files)
+            )
             
             # 风险分析
             await self._analyze_risks(project_data)
@@ -168,163 +258,73 @@ class RequirementAgent(BaseAgent):
                 content={"error": str(e)}
             )
 
-    async def _analyze_project_overview(self, project_data: Dict[str, Any], input_files: Dict[str, str]) -> None:
+    async def _analyze_project_overview(self, project_data: Dict[str, Any], formatted_files: str) -> None:
         """分析项目概览"""
+        overview = await self._analyze_overview_bundle(formatted_files)
+
         # 从项目数据中提取基本信息
         self.analysis_result.project_overview = {
             "name": project_data.get("name", "未知项目"),
             "description": project_data.get("description", ""),
-            "domain": await self._identify_domain(input_files),
-            "scope": await self._identify_scope(input_files),
-            "target_users": await self._identify_target_users(input_files)
+            "domain": overview.get("domain") or "通用软件",
+            "scope": overview.get("scope") or "待确定",
+            "target_users": overview.get("target_users") or "通用用户"
         }
 
-    async def _identify_domain(self, input_files: Dict[str, str]) -> str:
-        """识别项目领域"""
-        # 使用LLM分析项目领域
-        prompt = f"""
-        基于以下项目文档，识别项目所属的业务领域：
-        
-        {self._format_input_files(input_files)}
-        
-        请简洁地回答项目属于哪个业务领域（如：电商、金融、教育、医疗、工具软件等）。
-        """
+    async def _analyze_overview_bundle(self, formatted_files: str) -> Dict[str, str]:
+        """一次LLM调用识别项目领域、范围和目标用户"""
+        prompt = _PROMPT_OVERVIEW.substitute(files=formatted_files)
         
         try:
-            response = await self.ollama_client.generate(
-                model=self.config.llm_config["model"],
-                prompt=prompt,
-                options={
-                    "temperature": self.config.llm_config["temperature"],
-                    "num_predict": 100
-                }
-            )
-            return response.strip()
-        except Exception as e:
-            self.logger.warning(f"识别项目领域失败: {e}")
-            return "通用软件"
-
-    async def _identify_scope(self, input_files: Dict[str, str]) -> str:
-        """识别项目范围"""
-        prompt = f"""
-        基于以下项目文档，总结项目的核心功能范围：
-        
-        {self._format_input_files(input_files)}
-        
-        请用1-2句话概括项目的主要功能范围。
-        """
-        
-        try:
-            response = await self.ollama_client.generate(
-                model=self.config.llm_config["model"],
-                prompt=prompt,
-                options={
-                    "temperature": self.config.llm_config["temperature"],
-                    "num_predict": 200
+            response = await self._cached_generate(prompt, num_predict=450)
+            data = self._parse_json_response(response)
+            if isinstance(data, dict):
+                return {
+                    key: str(value).strip()
+                    for key, value in data.items()
+                    if key in ("domain", "scope", "target_users") and value
                 }
-            )
-            return response.strip()
         except Exception as e:
-            self.logger.warning(f"识别项目范围失败: {e}")
-            return "待确定"
+            self.logger.warning(f"分析项目概览失败: {e}")
+        return {}
 
-    async def _identify_target_users(self, input_files: Dict[str, str]) -> str:
-        """识别目标用户"""
-        prompt = f"""
-        基于以下项目文档，识别项目的目标用户群体：
-        
-        {self._format_input_files(input_files)}
-        
-        请简洁地描述项目的主要目标用户。
-        """
-        
-        try:
-            response = await self.ollama_client.generate(
-                model=self.config.llm_config["model"],
-                prompt=prompt,
-                options={
-                    "temperature": self.config.llm_config["temperature"],
-                    "num_predict": 150
-                }
-            )
-            return response.strip()
-        except Exception as e:
-            self.logger.warning(f"识别目标用户失败: {e}")
-            return "通用用户"
-
-    async def _extract_functional_requirements_from_data(self, input_files: Dict[str, str]) -> None:
+    async def _extract_functional_requirements_from_data(self, formatted_files: str) -> None:
         """从数据中提取功能需求"""
-        prompt = f"""
-        基于以下项目文档，提取功能需求。请以JSON格式返回，包含以下字段：
-        - id: 需求唯一标识
-        - name: 需求名称
-        - description: 详细描述
-        - priority: 优先级（高/中/低）
-        - category: 需求类别
-        - acceptance_criteria: 验收标准列表
-        
-        项目文档：
-        {self._format_input_files(input_files)}
-        
-        请返回JSON数组格式的功能需求列表。
-        """
+        prompt = _PROMPT_FUNCTIONAL_REQUIREMENTS.substitute(files=formatted_files)
         
         try:
-            response = await self.ollama_client.generate(
-                model=self.config.llm_config["model"],
-                prompt=prompt,
-                options={
-                    "temperature": self.config.llm_config["temperature"],
-                    "num_predict": 2000
-                }
-            )
+            response = await self._generate_json_array(prompt, num_predict=2000)
             
             # 解析JSON响应
             requirements_data = self._parse_json_response(response)
             if requirements_data:
-                for req_data in requirements_data:
-                    requirement = FunctionalRequirement(**req_data)
-                    self.analysis_result.functional_requirements.append(requirement)
+                self.analysis_result.functional_requirements.extend(
+                    _FUNCTIONAL_REQUIREMENTS.validate_python(requirements_data)
+                )
             
         except Exception as e:
             self.logger.warning(f"提取功能需求失败: {e}")
             # 添加默认需求
             self._add_default_functional_requirements()
 
-    async def _extract_non_functional_requirements(self, input_files: Dict[str, str]) -> None:
+    async def _extract_functional_requirements_and_use_cases(self, formatted_files: str) -> None:
+        """提取功能需求，然后基于功能需求生成用例"""
+        await self._extract_functional_requirements_from_data(formatted_files)
+        await self._generate_use_cases()
+
+    async def _extract_non_functional_requirements(self, formatted_files: str) -> None:
         """提取非功能需求"""
-        prompt = f"""
-        基于以下项目文档，识别非功能需求（性能、安全、可用性、可扩展性等）。
-        请以JSON格式返回，包含以下字段：
-        - id: 需求唯一标识
-        - name: 需求名称
-        - description: 详细描述
-        - category: 类别（性能/安全/可用性/可扩展性等）
-        - metrics: 度量标准列表
-        - constraints: 约束条件列表
-        
-        项目文档：
-        {self._format_input_files(input_files)}
-        
-        请返回JSON数组格式的非功能需求列表。
-        """
+        prompt = _PROMPT_NON_FUNCTIONAL_REQUIREMENTS.substitute(files=formatted_files)
         
         try:
-            response = await self.ollama_client.generate(
-                model=self.config.llm_config["model"],
-                prompt=prompt,
-                options={
-                    "temperature": self.config.llm_config["temperature"],
-                    "num_predict": 1500
-                }
-            )
+            response = await self._generate_json_array(prompt, num_predict=1500)
             
             # 解析JSON响应
             requirements_data = self._parse_json_response(response)
             if requirements_data:
-                for req_data in requirements_data:
-                    requirement = NonFunctionalRequirement(**req_data)
-                    self.analysis_result.non_functional_requirements.append(requirement)
+                self.analysis_result.non_functional_requirements.extend(
+                    _NON_FUNCTIONAL_REQUIREMENTS.validate_python(requirements_data)
+                )
             
         except Exception as e:
             self.logger.warning(f"提取非功能需求失败: {e}")
@@ -337,35 +337,60 @@ class RequirementAgent(BaseAgent):
             return
         
         # 基于功能需求生成用例
-        for req in self.analysis_result.functional_requirements[:5]:  # 限制数量
+        use_cases = self.analysis_result.use_cases
+        for req in islice(self.analysis_result.functional_requirements, _UC_MAX_COUNT):  # 限制数量
             use_case = UseCase(
-                id=f"UC_{len(self.analysis_result.use_cases) + 1:03d}",
+                id=f"UC_{len(use_cases) + 1:03d}",
                 name=f"用例：{req.name}",
                 actor="用户",
                 description=f"用户通过系统{req.description}",
-                preconditions=["用户已登录系统"],
-                main_flow=[
-                    "1. 用户访问系统",
-                    f"2. 用户执行{req.name}操作",
-                    "3. 系统处理请求",
-                    "4. 系统返回结果"
-                ],
-                postconditions=["操作完成"],
+                preconditions=list(_UC_PRECONDITIONS),
+                main_flow=[step.format(name=req.name) if "{" in step else step for step in _UC_FLOW_TEMPLATE],
+                postconditions=list(_UC_POSTCONDITIONS),
                 related_requirements=[req.id]
             )
-            self.analysis_result.use_cases.append(use_case)
+            use_cases.append(use_case)
 
     async def _identify_business_rules_and_constraints(self, input_files: Dict[str, str]) -> None:
         """识别业务规则和约束"""
-        # 从输入文件中提取业务规则
+        # 大文件的正则扫描放到线程中执行，避免阻塞事件循环
+        results: List[Tuple[List[str], List[str]]] = []
+        offloaded = {}
         for filename, content in input_files.items():
-            if "rule" in filename.lower() or "规则" in content:
-                rules = self._extract_rules_from_text(content)
-                self.analysis_result.business_rules.extend(rules)
-            
-            if "constraint" in filename.lower() or "约束" in content or "限制" in content:
-                constraints = self._extract_constraints_from_text(content)
-                self.analysis_result.constraints.extend(constraints)
+            if len(content) >= _THREAD_SCAN_MIN_SIZE:
+                offloaded[len(results)] = asyncio.to_thread(self._scan_file_rules, filename, content)
+                results.append(([], []))
+            else:
+                results.append(self._scan_file_rules(filename, content))
+
+        if offloaded:
+            for index, result in zip(offloaded, await asyncio.gather(*offloaded.values())):
+                results[index] = result
+
+        for rules, constraints in results:
+            self.analysis_result.business_rules.extend(rules)
+            self.analysis_result.constraints.extend(constraints)
+
+    def _scan_file_rules(self, filename: str, content: str) -> Tuple[List[str], List[str]]:
+        """从单个文件中提取业务规则和约束"""
+        lowered = filename.lower()
+        want_rules = "rule" in lowered or "规则" in content
+        want_constraints = "constraint" in lowered or "约束" in content or "限制" in content
+
+        if want_rules and want_constraints:
+            rules: List[str] = []
+            constraints: List[str] = []
+            for line in _KEYWORD_LINE_RE.findall(content):
+                if _RULE_KEYWORD_RE.search(line):
+                    rules.append(line.strip())
+                if _CONSTRAINT_KEYWORD_RE.search(line):
+                    constraints.append(line.strip())
+            return rules, constraints
+
+        return (
+            self._extract_rules_from_text(content) if want_rules else [],
+            self._extract_constraints_from_text(content) if want_constraints else [],
+        )
 
     async def _analyze_risks(self, project_data: Dict[str, Any]) -> None:
         """分析风险"""
@@ -379,51 +404,192 @@ class RequirementAgent(BaseAgent):
         ]
         self.analysis_result.risks.extend(common_risks)
 
+    def _llm_cache_key(self, prompt: str, num_predict: int) -> str:
+        """LLM响应缓存键"""
+        model = self.config.llm_config["model"]
+        temperature = self.config.llm_config["temperature"]
+        return hashlib.blake2b(
+            f"{model}\0{temperature}\0{num_predict}\0{prompt}".encode("utf-8"),
+            digest_size=16
+        ).hexdigest()
+
+    def _get_cached_response(self, key: str) -> Optional[str]:
+        """读取缓存的LLM响应"""
+        cached = self._llm_cache.get(key)
+        if cached is not None:
+            self._llm_cache.move_to_end(key)
+        return cached
+
+    def _cache_response(self, key: str, response: str) -> None:
+        """缓存LLM响应"""
+        self._llm_cache[key] = response
+        if len(self._llm_cache) > self.llm_cache_size:
+            self._llm_cache.popitem(last=False)
+
+    async def _deduplicated(self, key: str, produce: Callable[[], Awaitable[str]]) -> str:
+        """优先返回缓存；相同请求正在进行时等待其结果，否则发起新请求"""
+        while True:
+            cached = self._get_cached_response(key)
+            if cached is not None:
+                return cached
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            shared = await asyncio.shield(inflight)
+            if shared is not None:
+                return shared
+            # 发起方被取消：由等待者重新发起请求，而不是把取消传播给它们
+
+        future: asyncio.Future[Optional[str]] = asyncio.get_running_loop().create_future()
+        # 没有其他等待者时也标记异常已被读取，避免事件循环告警
+        future.add_done_callback(lambda f: f.exception())
+        self._inflight[key] = future
+        try:
+            response = await produce()
+        except asyncio.CancelledError:
+            future.set_result(None)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            self._cache_response(key, response)
+            future.set_result(response)
+            return response
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _cached_generate(self, prompt: str, num_predict: int) -> str:
+        """调用LLM生成文本，相同模型、提示词和参数的结果直接复用"""
+        return await self._deduplicated(
+            self._llm_cache_key(prompt, num_predict),
+            lambda: self.ollama_client.generate(
+                model=self.config.llm_config["model"],
+                prompt=prompt,
+                options={
+                    "temperature": self.config.llm_config["temperature"],
+                    "num_predict": num_predict
+                }
+            )
+        )
+
+    async def _generate_json_array(self, prompt: str, num_predict: int) -> str:
+        """流式生成JSON数组，数组闭合并可解析后立即停止生成"""
+        return await self._deduplicated(
+            self._llm_cache_key(prompt, num_predict),
+            lambda: self._stream_json_array(prompt, num_predict)
+        )
+
+    async def _stream_json_array(self, prompt: str, num_predict: int) -> str:
+        """流式读取LLM输出，截取第一个完整的JSON数组
+
+        逐个片段增量扫描括号深度，只在候选数组闭合时拼接一次；没有完整数组时返回全部输出。
+        """
+        received: List[str] = []  # 全部输出片段
+        parts: List[str] = []  # 当前候选数组（自 '[' 起）的片段
+        started = False
+        depth = 0
+        in_string = False
+        escaped = False
+
+        stream = self.ollama_client.generate_stream(
+            model=self.config.llm_config["model"],
+            prompt=prompt,
+            options={
+                "temperature": self.config.llm_config["temperature"],
+                "num_predict": num_predict
+            }
+        )
+        async with aclosing(stream):
+            async for chunk in stream:
+                received.append(chunk)
+                pending = chunk
+                while pending:
+                    if started:
+                        seg_start = pos = 0
+                    else:
+                        seg_start = pending.find('[')
+                        if seg_start < 0:
+                            break
+                        pos = seg_start + 1
+                        started, depth, in_string, escaped = True, 1, False, False
+                        parts = []
+
+                    # 增量扫描括号深度（忽略字符串中的括号）
+                    end = -1
+                    for index in range(pos, len(pending)):
+                        char = pending[index]
+                        if in_string:
+                            if escaped:
+                                escaped = False
+                            elif char == '\\':
+                                escaped = True
+                            elif char == '"':
+                                in_string = False
+                        elif char == '"':
+                            in_string = True
+                        elif char == '[':
+                            depth += 1
+                        elif char == ']':
+                            depth -= 1
+                            if depth == 0:
+                                end = index + 1
+                                break
+
+                    if end < 0:
+                        parts.append(pending[seg_start:])
+                        break
+
+                    parts.append(pending[seg_start:end])
+                    candidate = "".join(parts)
+                    try:
+                        orjson.loads(candidate)
+                    except orjson.JSONDecodeError:
+                        # 不是有效的JSON数组，从候选起点的下一个字符继续查找
+                        started = False
+                        pending = candidate[1:] + pending[end:]
+                        continue
+                    return candidate
+
+        return "".join(received)
+
     def _format_input_files(self, input_files: Dict[str, str]) -> str:
         """格式化输入文件内容"""
-        formatted = ""
-        for filename, content in input_files.items():
-            formatted += f"\n=== {filename} ===\n{content}\n"
-        return formatted
+        return "".join(
+            f"\n=== {filename} ===\n{content}\n"
+            for filename, content in input_files.items()
+        )
 
-    def _parse_json_response(self, response: str) -> Optional[List[Dict[str, Any]]]:
-        """解析JSON响应"""
+    def _parse_json_response(self, response: str) -> Optional[Any]:
+        """解析JSON响应（数组或对象）"""
         try:
             # 尝试直接解析
-            return json.loads(response)
-        except json.JSONDecodeError:
-            try:
-                # 尝试提取JSON部分
-                start = response.find('[')
-                end = response.rfind(']') + 1
+            return orjson.loads(response)
+        except orjson.JSONDecodeError:
+            # 尝试提取JSON部分，先出现的括号类型优先
+            candidates = sorted(
+                (response.find(open_char), open_char, close_char)
+                for open_char, close_char in (('[', ']'), ('{', '}'))
+            )
+            for start, open_char, close_char in candidates:
+                end = response.rfind(close_char) + 1
                 if start >= 0 and end > start:
-                    json_str = response[start:end]
-                    return json.loads(json_str)
-            except:
-                pass
+                    try:
+                        return orjson.loads(response[start:end])
+                    except orjson.JSONDecodeError:
+                        continue
         
         self.logger.warning("无法解析JSON响应")
         return None
 
     def _extract_rules_from_text(self, text: str) -> List[str]:
         """从文本中提取规则"""
-        rules = []
-        lines = text.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line and ('规则' in line or '必须' in line or '应该' in line):
-                rules.append(line)
-        return rules
+        return [line.strip() for line in _RULE_LINE_RE.findall(text)]
 
     def _extract_constraints_from_text(self, text: str) -> List[str]:
         """从文本中提取约束"""
-        constraints = []
-        lines = text.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line and ('约束' in line or '限制' in line or '不能' in line or '禁止' in line):
-                constraints.append(line)
-        return constraints
+        return [line.strip() for line in _CONSTRAINT_LINE_RE.findall(text)]
 
     def _add_default_functional_requirements(self) -> None:
         """添加默认功能需求"""
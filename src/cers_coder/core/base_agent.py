@@ -4,17 +4,24 @@
 
 import asyncio
 import logging
+import secrets
+import time
 from abc import ABC, abstractmethod
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
-from typing import Any, Dict, List, Optional, Set
-from uuid import UUID, uuid4
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
 
 from pydantic import BaseModel, Field
 
 from .message import Message, MessageType, create_error_message
 from .operation_recorder import OperationRecorder, OperationType
 
+# 消息循环每批最多取出的消息数
+_MAX_MESSAGE_BATCH = 32
+# 消息循环出错后的退避时间范围（秒）
+_ERROR_BACKOFF_MIN = 0.01
+_ERROR_BACKOFF_MAX = 0.5
+
 
 class AgentStatus(str, Enum):
     """智能体状态枚举"""
@@ -51,11 +58,23 @@ class AgentConfig(BaseModel):
 class BaseAgent(ABC):
     """智能体基类"""
 
+    __slots__ = (
+        "id", "config", "status", "logger", "operation_recorder",
+        "_message_queue", "_running_tasks", "response_handler",
+        "created_at", "_epoch_ns", "_last_activity_ns", "task_count", "error_count",
+        "_static_status", "_dispatch", "_stop_event", "_message_handler_task",
+    )
+
+    # 按智能体名称缓存的日志器
+    _LOGGERS: Dict[str, logging.Logger] = {}
+
     def __init__(self, config: AgentConfig, operation_recorder: Optional[OperationRecorder] = None):
-        self.id = str(uuid4())
+        self.id = secrets.token_hex(8)
         self.config = config
         self.status = AgentStatus.IDLE
-        self.logger = logging.getLogger(f"agent.{config.name}")
+        self.logger = BaseAgent._LOGGERS.get(config.name) or BaseAgent._LOGGERS.setdefault(
+            config.name, logging.getLogger(f"agent.{config.name}")
+        )
 
         # 操作记录器
         self.operation_recorder = operation_recorder
@@ -64,12 +83,34 @@ class BaseAgent(ABC):
         self._message_queue: asyncio.Queue[Message] = asyncio.Queue()
         self._running_tasks: Set[str] = set()
 
+        # 响应投递回调，由持有智能体的组件（如工作流控制器）设置；未设置时响应被丢弃
+        self.response_handler: Optional[Callable[[Message], Awaitable[None]]] = None
+
         # 状态信息
         self.created_at = datetime.now()
-        self.last_activity = datetime.now()
+        # 活动时间以单调时钟记录，读取时再换算为墙上时间
+        self._epoch_ns = time.monotonic_ns()
+        self._last_activity_ns = self._epoch_ns
         self.task_count = 0
         self.error_count = 0
 
+        # 状态信息中不变的部分只构建一次
+        self._static_status: Dict[str, Any] = {
+            "id": self.id,
+            "name": config.name,
+            "capabilities": [cap.value for cap in config.capabilities],
+            "max_concurrent_tasks": config.max_concurrent_tasks,
+            "created_at": self.created_at.isoformat(),
+        }
+
+        # 消息分发表
+        self._dispatch = {
+            MessageType.TASK_CREATE: self._handle_task_create,
+            MessageType.TASK_UPDATE: self._handle_task_update,
+            MessageType.AGENT_REQUEST: self._handle_agent_request,
+            MessageType.DATA_INPUT: self._handle_data_input,
+        }
+
         # 事件循环
         self._stop_event = asyncio.Event()
         self._message_handler_task: Optional[asyncio.Task] = None
@@ -79,6 +120,11 @@ class BaseAgent(ABC):
         """获取智能体名称"""
         return self.config.name
 
+    @property
+    def last_activity(self) -> datetime:
+        """最近活动时间"""
+        return self.created_at + timedelta(microseconds=(self._last_activity_ns - self._epoch_ns) // 1000)
+
     @property
     def is_busy(self) -> bool:
         """检查智能体是否忙碌"""
@@ -158,7 +204,7 @@ class BaseAgent(ABC):
             title=f"处理消息: {message.subject}",
             description=f"处理来自 {message.sender} 的 {message.type.value} 消息",
             input_data={
-                "message_id": str(message.id),
+                "message_id": message.str_id,
                 "message_type": message.type.value,
                 "sender": message.sender,
                 "subject": message.subject
@@ -167,19 +213,11 @@ class BaseAgent(ABC):
         )
 
         try:
-            self.last_activity = datetime.now()
+            self._last_activity_ns = time.monotonic_ns()
 
             # 根据消息类型分发处理
-            if message.type == MessageType.TASK_CREATE:
-                response = await self._handle_task_create(message)
-            elif message.type == MessageType.TASK_UPDATE:
-                response = await self._handle_task_update(message)
-            elif message.type == MessageType.AGENT_REQUEST:
-                response = await self._handle_agent_request(message)
-            elif message.type == MessageType.DATA_INPUT:
-                response = await self._handle_data_input(message)
-            else:
-                response = await self._handle_custom_message(message)
+            handler = self._dispatch.get(message.type, self._handle_custom_message)
+            response = await handler(message)
 
             # 完成操作记录
             if operation_id:
@@ -211,7 +249,7 @@ class BaseAgent(ABC):
                 error_code="MESSAGE_PROCESSING_ERROR",
                 error_type=type(e).__name__,
                 subject=f"处理消息失败: {message.subject}",
-                content={"original_message_id": str(message.id), "error": str(e)},
+                content={"original_message_id": message.str_id, "error": str(e)},
                 stack_trace=str(e)
             )
 
@@ -250,45 +288,76 @@ class BaseAgent(ABC):
 
     async def _message_handler(self) -> None:
         """消息处理循环"""
-        while not self._stop_event.is_set():
-            try:
-                # 等待消息或停止事件
-                message = await asyncio.wait_for(
-                    self._message_queue.get(),
-                    timeout=1.0
-                )
-                
-                # 处理消息
-                response = await self.process_message(message)
-                message.mark_processed()
-                
-                # 如果有响应消息，发送回去
-                if response:
-                    # 这里需要通过消息总线发送响应
-                    # 具体实现依赖于消息总线的接口
+        # 单批处理的消息数不超过智能体的并发上限
+        batch_size = max(1, min(_MAX_MESSAGE_BATCH, self.config.max_concurrent_tasks))
+        stop = asyncio.create_task(self._stop_event.wait())
+        backoff = _ERROR_BACKOFF_MIN
+        try:
+            while not self._stop_event.is_set():
+                # 等待消息或停止事件，空闲时不再按秒轮询
+                getter = asyncio.create_task(self._message_queue.get())
+                done, _ = await asyncio.wait({getter, stop}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+
+                # 一次取走队列中已积压的消息
+                batch = [getter.result()]
+                while len(batch) < batch_size:
+                    try:
+                        batch.append(self._message_queue.get_nowait())
+                    except asyncio.QueueEmpty:
+                        break
+
+                if len(batch) == 1:
+                    succeeded = await self._process_and_dispatch(batch[0])
+                else:
+                    succeeded = all(await asyncio.gather(*(self._process_and_dispatch(m) for m in batch)))
+
+                if succeeded:
+                    backoff = _ERROR_BACKOFF_MIN
+                    continue
+
+                # 连续出错时指数退避，停止事件到来时立即结束等待
+                try:
+                    await asyncio.wait_for(asyncio.shield(stop), timeout=backoff)
+                except asyncio.TimeoutError:
                     pass
-                    
-            except asyncio.TimeoutError:
-                # 超时是正常的，继续循环
-                continue
-            except Exception as e:
-                self.logger.error(f"消息处理循环错误: {e}", exc_info=True)
-                await asyncio.sleep(1)
+                backoff = min(backoff * 2, _ERROR_BACKOFF_MAX)
+        finally:
+            stop.cancel()
+
+    async def _process_and_dispatch(self, message: Message) -> bool:
+        """处理单条消息并投递响应，返回是否成功"""
+        try:
+            response = await self.process_message(message)
+            message.mark_processed()
+
+            # 如果有响应消息，直接投递给响应回调
+            if response:
+                await self._deliver_response(response)
+            return True
+        except Exception as e:
+            self.logger.error(f"消息处理循环错误: {e}", exc_info=True)
+            return False
+
+    async def _deliver_response(self, response: Message) -> None:
+        """投递响应消息，未设置响应回调时丢弃"""
+        if self.response_handler is None:
+            self.logger.debug(f"未设置响应回调，丢弃响应: {response.subject}")
+            return
+        await self.response_handler(response)
 
     def get_status(self) -> Dict[str, Any]:
         """获取智能体状态信息"""
         return {
-            "id": self.id,
-            "name": self.name,
+            **self._static_status,
             "status": self.status.value,
-            "capabilities": [cap.value for cap in self.config.capabilities],
             "is_busy": self.is_busy,
             "can_accept_task": self.can_accept_task,
             "running_tasks": len(self._running_tasks),
-            "max_concurrent_tasks": self.config.max_concurrent_tasks,
             "task_count": self.task_count,
             "error_count": self.error_count,
-            "created_at": self.created_at.isoformat(),
             "last_activity": self.last_activity.isoformat(),
         }
 
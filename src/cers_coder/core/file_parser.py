@@ -2,14 +2,61 @@
 文件解析器 - 解析标准输入文件（0.request.md等）
 """
 
+import asyncio
 import logging
+import os
 import re
+import sys
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-import aiofiles
 from pydantic import BaseModel, Field
 
+# 预编译的正则表达式
+_NUM_LIST_RE = re.compile(r'^\d+\.')
+_FEATURE_RE = re.compile(r'\*\s*\*\*([^*]+)\*\*[：:]\s*([^\n]+)')
+# 可能是标题、表格或列表的行：以#开头、包含|、或去掉前导空白后以*、-、数字开头
+_BLOCK_LINE_RE = re.compile(r'^(?:#|[^\n]*\||[^\S\n]*[-*\d])[^\n]*', re.MULTILINE)
+
+# 无序列表项的起始字符
+_BULLETS = ('*', '-')
+
+# 标准章节的名称（含带图标的写法），按顺序匹配第一个存在的章节
+_SECTION_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "project_name": ("项目名称", "🧱 项目名称"),
+    "project_goals": ("项目目标", "🎯 项目目标"),
+    "features": ("系统特性与设计原则", "🔧 系统特性与设计原则"),
+    "agents": ("智能体构成与职责定义", "🧩 智能体构成与职责定义"),
+    "outputs": ("项目输出要求", "📦 项目输出要求"),
+}
+
+# 智能体表格列名到 AgentSpec 字段的映射，未列出的列保存在 extra 中
+_AGENT_COLUMN_FIELDS = {
+    "智能体": "name",
+    "名称": "name",
+    "智能体名称": "name",
+    "职责": "responsibilities",
+    "职责描述": "responsibilities",
+}
+
+# 写入元数据的章节
+_METADATA_FIELDS = ("project_name", "project_goals")
+
+# 元数据中识别的技术关键词（小写）
+_TECH_KEYWORDS = ("python", "docker", "ollama", "llm", "智能体", "agent")
+# 关键词扫描时每次转小写的字符数
+_KEYWORD_SCAN_CHUNK = 64 * 1024
+
+
+def _find_section(sections: Dict[str, str], field: str) -> Optional[str]:
+    """按别名查找标准章节内容，不存在时返回None"""
+    for alias in _SECTION_ALIASES[field]:
+        text = sections.get(alias)
+        if text is not None:
+            return text
+    return None
+
 
 class InputFileSpec(BaseModel):
     """输入文件规范"""
@@ -29,6 +76,13 @@ class ParsedContent(BaseModel):
     lists: List[List[str]] = Field(default_factory=list, description="列表数据")
 
 
+class AgentSpec(BaseModel):
+    """智能体定义（来自需求文档中的智能体表格）"""
+    name: str = Field(default="", description="智能体名称")
+    responsibilities: str = Field(default="", description="职责")
+    extra: Dict[str, str] = Field(default_factory=dict, description="表格中的其他列")
+
+
 class ProjectRequirements(BaseModel):
     """项目需求"""
     name: str = Field(..., description="项目名称")
@@ -38,7 +92,7 @@ class ProjectRequirements(BaseModel):
     constraints: List[str] = Field(default_factory=list, description="限制条件")
     
     # 智能体配置
-    agents: List[Dict[str, str]] = Field(default_factory=list, description="智能体配置")
+    agents: List[AgentSpec] = Field(default_factory=list, description="智能体配置")
     workflow: List[Dict[str, str]] = Field(default_factory=list, description="工作流程")
     
     # 输出要求
@@ -54,6 +108,53 @@ class ProjectRequirements(BaseModel):
     environment: Dict[str, str] = Field(default_factory=dict, description="环境配置")
 
 
+# 解析结果缓存（LRU），键为 (路径, 修改时间, 文件大小)
+_PARSE_CACHE_SIZE = 128
+_PARSE_CACHE: "OrderedDict[Tuple[str, int, int], ParsedContent]" = OrderedDict()
+
+
+def _read_if_changed(file_path: Path) -> Tuple[Tuple[str, int, int], Optional[str]]:
+    """获取文件的缓存键，缓存中没有该版本时同时读取文件内容"""
+    stat = file_path.stat()
+    key = (str(file_path), stat.st_mtime_ns, stat.st_size)
+    if key in _PARSE_CACHE:
+        return key, None
+    return key, file_path.read_text(encoding='utf-8')
+
+
+def _find_keywords(text: str, keywords: Tuple[str, ...]) -> List[str]:
+    """不区分大小写地查找文本中出现的关键词（小写），按关键词顺序返回
+
+    分块转小写后用子串查找（C实现，少量关键词时比正则更快），避免复制整个文本；
+    所有关键词都找到后提前结束。
+    """
+    overlap = max(len(keyword) for keyword in keywords) - 1
+    remaining = list(keywords)
+    found = set()
+    for start in range(0, len(text), _KEYWORD_SCAN_CHUNK):
+        chunk = text[max(0, start - overlap):start + _KEYWORD_SCAN_CHUNK].lower()
+        for keyword in remaining:
+            if keyword in chunk:
+                found.add(keyword)
+        if len(found) == len(keywords):
+            break
+        remaining = [keyword for keyword in remaining if keyword not in found]
+    return [keyword for keyword in keywords if keyword in found]
+
+
+def _agent_spec_from_row(row: Dict[str, str]) -> AgentSpec:
+    """将智能体表格的一行转换为 AgentSpec"""
+    values: Dict[str, Any] = {}
+    extra: Dict[str, str] = {}
+    for header, value in row.items():
+        field = _AGENT_COLUMN_FIELDS.get(header)
+        if field is not None:
+            values[field] = value
+        else:
+            extra[header] = value
+    return AgentSpec(**values, extra=extra)
+
+
 class FileParser:
     """文件解析器"""
     
@@ -72,56 +173,86 @@ class FileParser:
 
     async def parse_all_files(self) -> Tuple[Dict[str, ParsedContent], List[str]]:
         """解析所有标准输入文件"""
+        # 一次目录扫描确定存在的文件，替代逐个stat
+        present = self._list_present_files()
+
+        # 各文件互不依赖，并发读取和解析
+        results = await asyncio.gather(*(self._parse_one(spec, present) for spec in self.STANDARD_FILES))
+
         parsed_files = {}
         missing_required = []
-        
-        for file_spec in self.STANDARD_FILES:
-            file_path = self.project_dir / file_spec.filename
-            
-            if file_path.exists():
-                try:
-                    content = await self._parse_markdown_file(file_path)
-                    parsed_files[file_spec.filename] = content
-                    self.logger.info(f"成功解析文件: {file_spec.filename}")
-                except Exception as e:
-                    self.logger.error(f"解析文件失败 {file_spec.filename}: {e}")
-                    parsed_files[file_spec.filename] = ParsedContent(
-                        filename=file_spec.filename,
-                        exists=False
-                    )
-            else:
-                if file_spec.required:
-                    missing_required.append(file_spec.filename)
-                    self.logger.error(f"必需文件缺失: {file_spec.filename}")
-                else:
-                    self.logger.info(f"可选文件不存在: {file_spec.filename}")
-                
-                parsed_files[file_spec.filename] = ParsedContent(
-                    filename=file_spec.filename,
-                    exists=False
-                )
+        for filename, content, missing in results:
+            parsed_files[filename] = content
+            if missing:
+                missing_required.append(filename)
         
         return parsed_files, missing_required
 
+    def _list_present_files(self) -> Set[str]:
+        """列出项目目录中存在的文件名"""
+        try:
+            with os.scandir(self.project_dir) as entries:
+                return {entry.name for entry in entries if entry.is_file()}
+        except OSError:
+            return set()
+
+    async def _parse_one(self, file_spec: InputFileSpec, present: Set[str]) -> Tuple[str, ParsedContent, bool]:
+        """解析单个标准输入文件，返回 (文件名, 解析结果, 是否缺失必需文件)"""
+        file_path = self.project_dir / file_spec.filename
+        
+        if file_spec.filename in present:
+            try:
+                content = await self._parse_markdown_file(file_path)
+                self.logger.info(f"成功解析文件: {file_spec.filename}")
+                return file_spec.filename, content, False
+            except Exception as e:
+                self.logger.error(f"解析文件失败 {file_spec.filename}: {e}")
+                return file_spec.filename, ParsedContent(filename=file_spec.filename, exists=False), False
+        
+        if file_spec.required:
+            self.logger.error(f"必需文件缺失: {file_spec.filename}")
+        else:
+            self.logger.info(f"可选文件不存在: {file_spec.filename}")
+        
+        return file_spec.filename, ParsedContent(filename=file_spec.filename, exists=False), file_spec.required
+
     async def _parse_markdown_file(self, file_path: Path) -> ParsedContent:
-        """解析Markdown文件"""
-        async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-            content = await f.read()
-        
-        # 解析章节
-        sections = self._extract_sections(content)
-        
-        # 解析表格
-        tables = self._extract_tables(content)
-        
-        # 解析列表
-        lists = self._extract_lists(content)
+        """解析Markdown文件，文件未变化时复用缓存的解析结果"""
+        # 文件状态和内容在同一次线程切换中获取，命中缓存时不读取内容
+        key, content = await asyncio.to_thread(_read_if_changed, file_path)
+        if content is None:
+            cached = _PARSE_CACHE.get(key)
+            if cached is not None:
+                _PARSE_CACHE.move_to_end(key)
+                # 返回副本，调用方修改结果不会影响缓存
+                return cached.model_copy(deep=True)
+            content = await asyncio.to_thread(file_path.read_text, encoding='utf-8')
+
+        parsed = self._parse_text(file_path.name, content)
+        _PARSE_CACHE[key] = parsed
+        if len(_PARSE_CACHE) > _PARSE_CACHE_SIZE:
+            _PARSE_CACHE.popitem(last=False)
+        return parsed.model_copy(deep=True)
+
+    def _parse_text(self, filename: str, content: str) -> ParsedContent:
+        """解析Markdown文本"""
+        # 空文件（或只有空白）无需解析
+        if not content or content.isspace():
+            return ParsedContent(
+                filename=filename,
+                exists=True,
+                content=content,
+                metadata={"mentioned_technologies": []}
+            )
+
+        # 一次遍历解析章节、表格和列表
+        sections, tables, lists = self._parse_all(content)
         
         # 提取元数据
         metadata = self._extract_metadata(content, sections)
         
         return ParsedContent(
-            filename=file_path.name,
+            filename=filename,
             exists=True,
             content=content,
             sections=sections,
@@ -130,136 +261,117 @@ class FileParser:
             lists=lists
         )
 
-    def _extract_sections(self, content: str) -> Dict[str, str]:
-        """提取Markdown章节"""
-        sections = {}
+    def _parse_all(self, content: str) -> Tuple[Dict[str, str], List[Dict[str, Any]], List[List[str]]]:
+        """单次遍历提取Markdown章节、表格和列表"""
+        sections: Dict[str, str] = {}
         current_section = None
-        current_content = []
-        
-        for line in content.split('\n'):
-            # 检查是否是标题行
-            if line.startswith('#'):
-                # 保存上一个章节
-                if current_section:
-                    sections[current_section] = '\n'.join(current_content).strip()
-                
-                # 开始新章节
-                current_section = line.strip('#').strip()
-                current_content = []
-            else:
+        # 章节正文直接按偏移量从原文切片，不逐行收集
+        section_start = 0
+
+        tables: List[Dict[str, Any]] = []
+        table_headers: Optional[List[str]] = None
+        table_rows: List[Dict[str, str]] = []
+        table_line_count = 0
+
+        lists: List[List[str]] = []
+        current_list: List[str] = []
+
+        # 正则只匹配可能是标题、表格或列表的行，普通文本行由C层跳过
+        next_start = 0
+        for match in _BLOCK_LINE_RE.finditer(content):
+            line_start = match.start()
+            if line_start != next_start:
+                # 中间跳过了普通行，当前表格和列表到此结束
+                if table_headers is not None:
+                    if table_line_count >= 2:
+                        tables.append(self._build_table(table_headers, table_rows))
+                    table_headers = None
+                if current_list:
+                    lists.append(current_list)
+                    current_list = []
+            next_start = match.end() + 1
+
+            raw_line = match.group()
+            line = raw_line.strip()
+
+            # 章节：标题行开始新章节，到下一个标题行之前的内容为章节正文
+            if raw_line.startswith('#'):
                 if current_section:
-                    current_content.append(line)
-        
-        # 保存最后一个章节
+                    sections[current_section] = content[section_start:line_start].strip()
+                # 章节名和表头在各文件、各次解析间大量重复，驻留以共享存储
+                current_section = sys.intern(line.strip('#').strip())
+                section_start = next_start
+
+            # 表格：以|开头和结尾的行开始表格，连续包含|的行都属于该表格
+            # 第一行为标题行，第二行为分隔行，其后每行在读到时直接解析为数据行
+            if table_headers is not None:
+                if '|' in raw_line:
+                    table_line_count += 1
+                    if table_line_count > 2:
+                        cells = line.split('|')[1:-1]
+                        if len(cells) == len(table_headers):
+                            table_rows.append(dict(zip(table_headers, (cell.strip() for cell in cells))))
+                else:
+                    if table_line_count >= 2:  # 至少有标题行和分隔行
+                        tables.append(self._build_table(table_headers, table_rows))
+                    table_headers = None
+            elif '|' in line and line.startswith('|') and line.endswith('|'):
+                table_headers = [sys.intern(cell.strip()) for cell in line.split('|')[1:-1]]
+                table_rows = []
+                table_line_count = 1
+
+            # 列表：连续的列表项组成一个列表
+            first = line[:1]
+            if first in _BULLETS:
+                current_list.append(line[1:].strip())
+            elif first.isdigit() and (num := _NUM_LIST_RE.match(line)):
+                current_list.append(line[num.end():].lstrip())
+            elif current_list:
+                lists.append(current_list)
+                current_list = []
+
+        # 保存最后的章节、表格和列表
         if current_section:
-            sections[current_section] = '\n'.join(current_content).strip()
-        
-        return sections
+            sections[current_section] = content[section_start:].strip()
+        if table_headers is not None and table_line_count >= 2:
+            tables.append(self._build_table(table_headers, table_rows))
+        if current_list:
+            lists.append(current_list)
+
+        return sections, tables, lists
+
+    def _extract_sections(self, content: str) -> Dict[str, str]:
+        """提取Markdown章节"""
+        return self._parse_all(content)[0]
 
     def _extract_tables(self, content: str) -> List[Dict[str, Any]]:
         """提取Markdown表格"""
-        tables = []
-        lines = content.split('\n')
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            # 检查是否是表格行
-            if '|' in line and line.startswith('|') and line.endswith('|'):
-                # 找到表格开始
-                table_lines = []
-                while i < len(lines) and '|' in lines[i]:
-                    table_lines.append(lines[i].strip())
-                    i += 1
-                
-                if len(table_lines) >= 2:  # 至少有标题行和分隔行
-                    table = self._parse_table(table_lines)
-                    if table:
-                        tables.append(table)
-                continue
-            
-            i += 1
-        
-        return tables
+        return self._parse_all(content)[1]
 
-    def _parse_table(self, table_lines: List[str]) -> Optional[Dict[str, Any]]:
-        """解析单个表格"""
-        if len(table_lines) < 2:
-            return None
-        
-        # 解析标题行
-        header_line = table_lines[0]
-        headers = [cell.strip() for cell in header_line.split('|')[1:-1]]
-        
-        # 跳过分隔行
-        data_lines = table_lines[2:]
-        
-        rows = []
-        for line in data_lines:
-            cells = [cell.strip() for cell in line.split('|')[1:-1]]
-            if len(cells) == len(headers):
-                row = dict(zip(headers, cells))
-                rows.append(row)
-        
+    def _extract_lists(self, content: str) -> List[List[str]]:
+        """提取Markdown列表"""
+        return self._parse_all(content)[2]
+
+    def _build_table(self, headers: List[str], rows: List[Dict[str, str]]) -> Dict[str, Any]:
+        """组装表格数据"""
         return {
             "headers": headers,
             "rows": rows,
             "row_count": len(rows)
         }
 
-    def _extract_lists(self, content: str) -> List[List[str]]:
-        """提取Markdown列表"""
-        lists = []
-        current_list = []
-        
-        for line in content.split('\n'):
-            line = line.strip()
-            
-            # 检查是否是列表项
-            if line.startswith('*') or line.startswith('-') or re.match(r'^\d+\.', line):
-                # 提取列表项内容
-                if line.startswith('*') or line.startswith('-'):
-                    item = line[1:].strip()
-                else:
-                    item = re.sub(r'^\d+\.\s*', '', line)
-                
-                current_list.append(item)
-            else:
-                # 如果不是列表项且当前有列表，保存当前列表
-                if current_list:
-                    lists.append(current_list)
-                    current_list = []
-        
-        # 保存最后一个列表
-        if current_list:
-            lists.append(current_list)
-        
-        return lists
-
     def _extract_metadata(self, content: str, sections: Dict[str, str]) -> Dict[str, Any]:
         """提取元数据"""
         metadata = {}
         
         # 从内容中提取关键信息
-        if "项目名称" in sections:
-            metadata["project_name"] = sections["项目名称"].strip()
-        elif "🧱 项目名称" in sections:
-            metadata["project_name"] = sections["🧱 项目名称"].strip()
-        
-        if "项目目标" in sections:
-            metadata["project_goals"] = sections["项目目标"].strip()
-        elif "🎯 项目目标" in sections:
-            metadata["project_goals"] = sections["🎯 项目目标"].strip()
+        for field in _METADATA_FIELDS:
+            text = _find_section(sections, field)
+            if text is not None:
+                metadata[field] = text.strip()
         
         # 提取技术栈信息
-        tech_keywords = ["python", "docker", "ollama", "llm", "智能体", "agent"]
-        mentioned_tech = []
-        content_lower = content.lower()
-        for keyword in tech_keywords:
-            if keyword in content_lower:
-                mentioned_tech.append(keyword)
-        metadata["mentioned_technologies"] = mentioned_tech
+        metadata["mentioned_technologies"] = _find_keywords(content, _TECH_KEYWORDS)
         
         return metadata
 
@@ -292,55 +404,55 @@ class FileParser:
         
         return requirements
 
+    async def extract_requirements_and_inputs(
+        self, parsed_files: Dict[str, ParsedContent]
+    ) -> Tuple[ProjectRequirements, Dict[str, str]]:
+        """提取项目需求，并返回存在的输入文件内容"""
+        requirements = await self.extract_requirements(parsed_files)
+        input_files = {
+            filename: parsed.content
+            for filename, parsed in parsed_files.items()
+            if parsed.exists
+        }
+        return requirements, input_files
+
     async def _extract_from_request_file(self, file_content: ParsedContent, requirements: ProjectRequirements) -> None:
         """从request文件提取需求"""
         sections = file_content.sections
         
         # 提取项目名称
-        for key in ["项目名称", "🧱 项目名称"]:
-            if key in sections:
-                requirements.name = sections[key].strip()
-                break
+        name = _find_section(sections, "project_name")
+        if name is not None:
+            requirements.name = name.strip()
         
         # 提取项目目标
-        for key in ["项目目标", "🎯 项目目标"]:
-            if key in sections:
-                requirements.description = sections[key].strip()
-                break
+        goals = _find_section(sections, "project_goals")
+        if goals is not None:
+            requirements.description = goals.strip()
         
         # 提取系统特性
-        for key in ["系统特性与设计原则", "🔧 系统特性与设计原则"]:
-            if key in sections:
-                features_text = sections[key]
-                # 提取以*开头的特性列表
-                features = re.findall(r'\*\s*\*\*([^*]+)\*\*[：:]\s*([^\n]+)', features_text)
-                for feature_name, feature_desc in features:
-                    requirements.features.append(f"{feature_name}: {feature_desc}")
-                break
+        features_text = _find_section(sections, "features")
+        if features_text is not None:
+            # 提取以*开头的特性列表
+            for feature_name, feature_desc in _FEATURE_RE.findall(features_text):
+                requirements.features.append(f"{feature_name}: {feature_desc}")
         
         # 提取智能体信息
-        for key in ["智能体构成与职责定义", "🧩 智能体构成与职责定义"]:
-            if key in sections:
-                # 从表格中提取智能体信息
-                for table in file_content.tables:
-                    if "智能体" in table.get("headers", []) or "职责" in table.get("headers", []):
-                        for row in table["rows"]:
-                            agent_info = {}
-                            for header, value in row.items():
-                                agent_info[header] = value
-                            requirements.agents.append(agent_info)
-                break
+        if _find_section(sections, "agents") is not None:
+            # 从表格中提取智能体信息
+            for table in file_content.tables:
+                if "智能体" in table.get("headers", []) or "职责" in table.get("headers", []):
+                    for row in table["rows"]:
+                        requirements.agents.append(_agent_spec_from_row(row))
         
         # 提取输出要求
-        for key in ["项目输出要求", "📦 项目输出要求"]:
-            if key in sections:
-                # 从表格中提取输出要求
-                for table in file_content.tables:
-                    if "目录/文件" in table.get("headers", []) or "描述" in table.get("headers", []):
-                        for row in table["rows"]:
-                            if "目录/文件" in row and "描述" in row:
-                                requirements.outputs[row["目录/文件"]] = row["描述"]
-                break
+        if _find_section(sections, "outputs") is not None:
+            # 从表格中提取输出要求
+            for table in file_content.tables:
+                if "目录/文件" in table.get("headers", []) or "描述" in table.get("headers", []):
+                    for row in table["rows"]:
+                        if "目录/文件" in row and "描述" in row:
+                            requirements.outputs[row["目录/文件"]] = row["描述"]
 
     async def _extract_from_rule_file(self, file_content: ParsedContent, requirements: ProjectRequirements) -> None:
         """从rule文件提取编码规则"""
@@ -2,12 +2,34 @@
 消息系统 - 智能体间通信的消息定义和处理
 """
 
+import os
+import time
+from dataclasses import asdict, dataclass, field, fields, is_dataclass
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, Optional, Union
-from uuid import UUID, uuid4
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from uuid import UUID
 
-from pydantic import BaseModel, Field
+import orjson
+
+# 当前时间缓存：同一毫秒内创建/处理的消息复用同一个时间对象
+_now_bucket: int = -1
+_now_value: datetime = datetime.min
+
+
+def _now_cached() -> datetime:
+    """获取当前时间（毫秒级缓存）"""
+    global _now_bucket, _now_value
+    bucket = time.monotonic_ns() // 1_000_000
+    if bucket != _now_bucket:
+        _now_bucket = bucket
+        _now_value = datetime.now()
+    return _now_value
+
+
+def _new_message_id() -> int:
+    """生成128位随机消息ID"""
+    return int.from_bytes(os.urandom(16), "big")
 
 
 class MessageType(str, Enum):
@@ -49,44 +71,50 @@ class MessagePriority(int, Enum):
     URGENT = 4
 
 
-class Message(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class Message:
     """智能体间通信的消息基类"""
     
-    id: UUID = Field(default_factory=uuid4, description="消息唯一标识")
-    type: MessageType = Field(..., description="消息类型")
-    sender: str = Field(..., description="发送者标识")
-    receiver: Optional[str] = Field(None, description="接收者标识，None表示广播")
-    priority: MessagePriority = Field(default=MessagePriority.NORMAL, description="消息优先级")
+    type: MessageType  # 消息类型
+    sender: str  # 发送者标识
+    subject: str  # 消息主题
+    id: int = field(default_factory=_new_message_id)  # 消息唯一标识（128位整数）
+    receiver: Optional[str] = None  # 接收者标识，None表示广播
+    priority: MessagePriority = MessagePriority.NORMAL  # 消息优先级
     
     # 消息内容
-    subject: str = Field(..., description="消息主题")
-    content: Dict[str, Any] = Field(default_factory=dict, description="消息内容")
+    content: Dict[str, Any] = field(default_factory=dict)
     
     # 时间戳
-    created_at: datetime = Field(default_factory=datetime.now, description="创建时间")
-    expires_at: Optional[datetime] = Field(None, description="过期时间")
+    created_at: datetime = field(default_factory=_now_cached)  # 创建时间
+    expires_at: Optional[datetime] = None  # 过期时间
     
     # 消息状态
-    is_processed: bool = Field(default=False, description="是否已处理")
-    processed_at: Optional[datetime] = Field(None, description="处理时间")
+    is_processed: bool = False  # 是否已处理
+    processed_at: Optional[datetime] = None  # 处理时间
     
     # 关联信息
-    correlation_id: Optional[UUID] = Field(None, description="关联消息ID")
-    reply_to: Optional[UUID] = Field(None, description="回复消息ID")
+    correlation_id: Optional[int] = None  # 关联消息ID
+    reply_to: Optional[int] = None  # 回复消息ID
     
     # 元数据
-    metadata: Dict[str, Any] = Field(default_factory=dict, description="元数据")
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def str_id(self) -> str:
+        """UUID格式的消息ID字符串"""
+        return str(UUID(int=self.id))
 
     def mark_processed(self) -> None:
         """标记消息为已处理"""
         self.is_processed = True
-        self.processed_at = datetime.now()
+        self.processed_at = _now_cached()
 
     def is_expired(self) -> bool:
         """检查消息是否过期"""
         if self.expires_at is None:
             return False
-        return datetime.now() > self.expires_at
+        return _now_cached() > self.expires_at
 
     def create_reply(
         self,
@@ -108,36 +136,102 @@ class Message(BaseModel):
 
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
-        return self.model_dump()
+        return asdict(self)
+
+    def to_json(self) -> bytes:
+        """序列化为JSON字节串（消息ID输出为UUID字符串）"""
+        return orjson.dumps(self, default=_json_default, option=orjson.OPT_PASSTHROUGH_DATACLASS)
+
+    @classmethod
+    def from_json(cls, data: Union[bytes, str]) -> "Message":
+        """从JSON字节串创建消息"""
+        return cls.from_dict(orjson.loads(data))
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Message":
-        """从字典创建消息"""
-        return cls(**data)
+        """从字典创建消息，兼容JSON反序列化得到的字符串字段"""
+        known = _field_names(cls)
+        values = {key: value for key, value in data.items() if key in known}
+        for key, (target, convert) in _FIELD_CONVERTERS.items():
+            value = values.get(key)
+            if value is not None and not isinstance(value, target):
+                values[key] = convert(value)
+        return cls(**values)
 
 
+@dataclass(slots=True, kw_only=True)
 class TaskMessage(Message):
     """任务相关消息"""
     
-    task_id: str = Field(..., description="任务ID")
-    task_name: str = Field(..., description="任务名称")
-    task_status: Optional[str] = Field(None, description="任务状态")
+    task_id: str  # 任务ID
+    task_name: str  # 任务名称
+    task_status: Optional[str] = None  # 任务状态
 
 
+@dataclass(slots=True, kw_only=True)
 class DataMessage(Message):
     """数据传输消息"""
     
-    data_type: str = Field(..., description="数据类型")
-    data_format: str = Field(default="json", description="数据格式")
-    data_size: Optional[int] = Field(None, description="数据大小（字节）")
+    data_type: str  # 数据类型
+    data_format: str = "json"  # 数据格式
+    data_size: Optional[int] = None  # 数据大小（字节）
 
 
+@dataclass(slots=True, kw_only=True)
 class ErrorMessage(Message):
     """错误消息"""
     
-    error_code: str = Field(..., description="错误代码")
-    error_type: str = Field(..., description="错误类型")
-    stack_trace: Optional[str] = Field(None, description="堆栈跟踪")
+    error_code: str  # 错误代码
+    error_type: str  # 错误类型
+    stack_trace: Optional[str] = None  # 堆栈跟踪
+
+
+def _to_message_id(value: Any) -> int:
+    """将UUID或其字符串形式转换为整数消息ID"""
+    if isinstance(value, UUID):
+        return value.int
+    text = str(value)
+    return int(text) if text.isdigit() else UUID(text).int
+
+
+# 需要以UUID形式序列化的ID字段（128位整数超出JSON整数范围）
+_ID_FIELDS = ("id", "correlation_id", "reply_to")
+
+
+def _json_default(obj: Any) -> Any:
+    """orjson序列化钩子：消息转为字段字典，其他数据类按常规展开"""
+    if isinstance(obj, Message):
+        data = {name: getattr(obj, name) for name in _field_names(type(obj))}
+        for name in _ID_FIELDS:
+            if data[name] is not None:
+                data[name] = UUID(int=data[name])
+        return data
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return asdict(obj)
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+
+# from_dict 需要从字符串还原的字段：字段名 -> (目标类型, 转换函数)
+_FIELD_CONVERTERS: Dict[str, Tuple[type, Callable[[Any], Any]]] = {
+    "type": (MessageType, MessageType),
+    "priority": (MessagePriority, MessagePriority),
+    "id": (int, _to_message_id),
+    "correlation_id": (int, _to_message_id),
+    "reply_to": (int, _to_message_id),
+    "created_at": (datetime, datetime.fromisoformat),
+    "expires_at": (datetime, datetime.fromisoformat),
+    "processed_at": (datetime, datetime.fromisoformat),
+}
+
+_FIELD_NAMES: Dict[type, Tuple[str, ...]] = {}
+
+
+def _field_names(cls: type) -> Tuple[str, ...]:
+    """获取消息类的字段名（按定义顺序，按类缓存）"""
+    names = _FIELD_NAMES.get(cls)
+    if names is None:
+        names = _FIELD_NAMES[cls] = tuple(f.name for f in fields(cls))
+    return names
 
 
 # 消息工厂函数
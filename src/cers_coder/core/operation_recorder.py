@@ -2,16 +2,34 @@
 操作记录系统 - 记录主流程和智能体的所有操作，支持复盘查看
 """
 
-import json
+import asyncio
+import gzip
 import logging
+import os
+import shutil
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import asdict, dataclass, field, fields
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from types import TracebackType
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple, Type, Union
 from uuid import UUID, uuid4
 
 import aiofiles
-from pydantic import BaseModel, Field
+import orjson
+
+# 内存中保留的未完成操作上限
+_MAX_ACTIVE_OPERATIONS = 10_000
+
+# 压缩后的历史会话文件后缀
+_COMPRESSED_SUFFIX = ".gz"
+
+
+def _session_id_of(session_file: Path) -> str:
+    """从会话文件名中解析会话ID"""
+    return session_file.name[len("session_"):].split(".", 1)[0]
 
 
 class OperationType(str, Enum):
@@ -73,47 +91,48 @@ class OperationStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
-class OperationRecord(BaseModel):
-    """操作记录模型"""
-    
-    id: str = Field(default_factory=lambda: str(uuid4()), description="记录ID")
-    operation_type: OperationType = Field(..., description="操作类型")
-    status: OperationStatus = Field(default=OperationStatus.STARTED, description="操作状态")
+@dataclass(slots=True, kw_only=True)
+class OperationRecord:
+    """操作记录"""
     
-    # 操作主体信息
-    actor: str = Field(..., description="操作执行者（系统/智能体名称）")
-    target: Optional[str] = Field(None, description="操作目标")
+    operation_type: OperationType  # 操作类型
+    actor: str  # 操作执行者（系统/智能体名称）
+    title: str  # 操作标题
+    id: str = field(default_factory=lambda: str(uuid4()))  # 记录ID
+    status: OperationStatus = OperationStatus.STARTED  # 操作状态
+    target: Optional[str] = None  # 操作目标
     
     # 操作内容
-    title: str = Field(..., description="操作标题")
-    description: str = Field(default="", description="操作描述")
-    input_data: Dict[str, Any] = Field(default_factory=dict, description="输入数据")
-    output_data: Dict[str, Any] = Field(default_factory=dict, description="输出数据")
+    description: str = ""  # 操作描述
+    input_data: Dict[str, Any] = field(default_factory=dict)  # 输入数据
+    output_data: Dict[str, Any] = field(default_factory=dict)  # 输出数据
     
     # 时间信息
-    start_time: datetime = Field(default_factory=datetime.now, description="开始时间")
-    end_time: Optional[datetime] = Field(None, description="结束时间")
-    duration: Optional[float] = Field(None, description="持续时间（秒）")
+    start_time: datetime = field(default_factory=datetime.now)  # 开始时间
+    end_time: Optional[datetime] = None  # 结束时间
+    duration: Optional[float] = None  # 持续时间（秒）
+    # 单调时钟开始时间（纳秒），仅用于计算持续时间，不写入文件
+    start_monotonic_ns: int = field(default_factory=time.monotonic_ns, init=False, repr=False, compare=False)
     
     # 关联信息
-    project_id: Optional[str] = Field(None, description="项目ID")
-    session_id: Optional[str] = Field(None, description="会话ID")
-    parent_operation_id: Optional[str] = Field(None, description="父操作ID")
+    project_id: Optional[str] = None  # 项目ID
+    session_id: Optional[str] = None  # 会话ID
+    parent_operation_id: Optional[str] = None  # 父操作ID
     
     # 结果信息
-    success: bool = Field(default=True, description="是否成功")
-    error_message: Optional[str] = Field(None, description="错误信息")
-    error_details: Dict[str, Any] = Field(default_factory=dict, description="错误详情")
+    success: bool = True  # 是否成功
+    error_message: Optional[str] = None  # 错误信息
+    error_details: Dict[str, Any] = field(default_factory=dict)  # 错误详情
     
     # 元数据
-    metadata: Dict[str, Any] = Field(default_factory=dict, description="元数据")
-    tags: List[str] = Field(default_factory=list, description="标签")
+    metadata: Dict[str, Any] = field(default_factory=dict)  # 元数据
+    tags: List[str] = field(default_factory=list)  # 标签
 
     def complete(self, success: bool = True, output_data: Optional[Dict[str, Any]] = None, 
                 error_message: Optional[str] = None) -> None:
         """完成操作记录"""
         self.end_time = datetime.now()
-        self.duration = (self.end_time - self.start_time).total_seconds()
+        self.duration = (time.monotonic_ns() - self.start_monotonic_ns) / 1e9
         self.success = success
         self.status = OperationStatus.COMPLETED if success else OperationStatus.FAILED
         
@@ -129,6 +148,11 @@ class OperationRecord(BaseModel):
         if error_details:
             self.error_details.update(error_details)
 
+    def cancel(self, reason: str) -> None:
+        """标记操作未完成即被取消"""
+        self.complete(success=False, error_message=reason)
+        self.status = OperationStatus.CANCELLED
+
     def add_metadata(self, key: str, value: Any) -> None:
         """添加元数据"""
         self.metadata[key] = value
@@ -138,6 +162,51 @@ class OperationRecord(BaseModel):
         if tag not in self.tags:
             self.tags.append(tag)
 
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式"""
+        data = asdict(self)
+        del data["start_monotonic_ns"]
+        return data
+
+    def to_json(self) -> bytes:
+        """序列化为JSON字节串（无法直接序列化的输入输出数据按字符串写出）"""
+        return orjson.dumps(self, default=_json_default, option=orjson.OPT_PASSTHROUGH_DATACLASS)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "OperationRecord":
+        """从字典创建记录，兼容JSONL中的字符串字段"""
+        # 本版本写出的记录字段与定义一致，直接复制；含未知字段（其他版本）时才逐项过滤
+        if data.keys() <= _RECORD_FIELD_SET:
+            values = dict(data)
+        else:
+            values = {key: value for key, value in data.items() if key in _RECORD_FIELD_SET}
+        for key, (target, convert) in _RECORD_CONVERTERS.items():
+            value = values.get(key)
+            if value is not None and not isinstance(value, target):
+                values[key] = convert(value)
+        return cls(**values)
+
+
+# 写入文件的字段（按定义顺序）
+_RECORD_FIELDS = tuple(f.name for f in fields(OperationRecord) if f.init)
+_RECORD_FIELD_SET = frozenset(_RECORD_FIELDS)
+
+
+def _json_default(obj: Any) -> Any:
+    """orjson序列化钩子：记录转为字段字典，其他无法序列化的值转为字符串"""
+    if isinstance(obj, OperationRecord):
+        return {name: getattr(obj, name) for name in _RECORD_FIELDS}
+    return str(obj)
+
+
+# from_dict 需要从字符串还原的字段：字段名 -> (目标类型, 转换函数)
+_RECORD_CONVERTERS: Dict[str, Tuple[type, Callable[[Any], Any]]] = {
+    "operation_type": (OperationType, OperationType),
+    "status": (OperationStatus, OperationStatus),
+    "start_time": (datetime, datetime.fromisoformat),
+    "end_time": (datetime, datetime.fromisoformat),
+}
+
 
 class OperationRecorder:
     """操作记录器"""
@@ -153,13 +222,29 @@ class OperationRecorder:
         
         # 当前会话的记录文件
         self.session_file = self.records_dir / f"session_{self.session_id}.jsonl"
+
+        # 持久化操作的开始标记文件
+        self.pending_file = self.records_dir / f"pending_{self.session_id}.jsonl"
+
+        # 工作空间共享的记录索引：每条记录对应其所在会话文件的偏移与长度
+        self.index_file = self.records_dir / "index.jsonl"
         
-        # 内存中的记录缓存
-        self.active_operations: Dict[str, OperationRecord] = {}
+        # 内存中的记录缓存（按最近使用排序，超出上限时淘汰最久未使用的操作）
+        self.active_operations: OrderedDict[str, OperationRecord] = OrderedDict()
         
         # 日志器
         self.logger = logging.getLogger("operation_recorder")
 
+        # 写入缓冲：记录先进入缓冲区，由后台任务按批追加到文件
+        self.batch_size = 32
+        self.batch_timeout = 0.1
+        self._pending: List[bytes] = []
+        self._write_lock = asyncio.Lock()
+        self._flush_wakeup = asyncio.Event()
+        self._flusher_task: Optional[asyncio.Task] = None
+        # 会话文件与索引文件句柄，首次写入时一起打开并在整个会话内复用
+        self._handles: Optional[Tuple[BinaryIO, BinaryIO]] = None
+
     async def start_operation(
         self,
         operation_type: OperationType,
@@ -169,9 +254,14 @@ class OperationRecorder:
         target: Optional[str] = None,
         input_data: Optional[Dict[str, Any]] = None,
         parent_operation_id: Optional[str] = None,
-        tags: Optional[List[str]] = None
+        tags: Optional[List[str]] = None,
+        durable: bool = False
     ) -> str:
-        """开始记录操作"""
+        """开始记录操作
+
+        操作只保存在内存中，完成时才写入一次完整记录；durable=True 时额外写入一条
+        精简的开始标记，进程异常退出后可据此找出未完成的操作。
+        """
         
         record = OperationRecord(
             operation_type=operation_type,
@@ -188,9 +278,14 @@ class OperationRecorder:
         
         # 缓存活跃操作
         self.active_operations[record.id] = record
+        if len(self.active_operations) > _MAX_ACTIVE_OPERATIONS:
+            evicted_id, evicted = self.active_operations.popitem(last=False)
+            self.logger.warning(f"活跃操作过多，淘汰未完成的操作: {evicted.title} ({evicted_id})")
+            evicted.fail("操作未完成即被淘汰")
+            await self._write_record(evicted)
         
-        # 写入文件
-        await self._write_record(record)
+        if durable:
+            await self._write_start_marker(record)
         
         self.logger.debug(f"开始操作记录: {record.title} ({record.id})")
         return record.id
@@ -205,12 +300,12 @@ class OperationRecorder:
     ) -> None:
         """完成操作记录"""
         
-        if operation_id not in self.active_operations:
+        # 取出即从活跃操作中移除
+        record = self.active_operations.pop(operation_id, None)
+        if record is None:
             self.logger.warning(f"操作记录不存在: {operation_id}")
             return
         
-        record = self.active_operations[operation_id]
-        
         if success:
             record.complete(success=True, output_data=output_data)
         else:
@@ -219,9 +314,6 @@ class OperationRecorder:
         # 更新文件
         await self._write_record(record)
         
-        # 从活跃操作中移除
-        del self.active_operations[operation_id]
-        
         status = "成功" if success else "失败"
         self.logger.debug(f"操作记录{status}: {record.title} ({operation_id})")
 
@@ -235,11 +327,11 @@ class OperationRecorder:
     ) -> None:
         """更新操作记录"""
         
-        if operation_id not in self.active_operations:
+        record = self.active_operations.get(operation_id)
+        if record is None:
             self.logger.warning(f"操作记录不存在: {operation_id}")
             return
-        
-        record = self.active_operations[operation_id]
+        self.active_operations.move_to_end(operation_id)
         
         if status:
             record.status = status
@@ -253,9 +345,6 @@ class OperationRecorder:
         if tags:
             for tag in tags:
                 record.add_tag(tag)
-        
-        # 更新文件
-        await self._write_record(record)
 
     async def record_instant_operation(
         self,
@@ -292,54 +381,232 @@ class OperationRecorder:
         return operation_id
 
     async def _write_record(self, record: OperationRecord) -> None:
-        """写入记录到文件"""
+        """将记录放入写入缓冲区"""
+        try:
+            self._pending.append(record.to_json())
+        except Exception as e:
+            self.logger.error(f"序列化操作记录失败: {e}")
+            return
+
+        if len(self._pending) >= self.batch_size:
+            self._flush_wakeup.set()
+        if self._flusher_task is None or self._flusher_task.done():
+            self._flusher_task = asyncio.create_task(self._flusher())
+
+    async def _write_start_marker(self, record: OperationRecord) -> None:
+        """写入操作开始标记（仅包含ID与开始时间）"""
+        marker = orjson.dumps({"id": record.id, "started": record.start_time}) + b'\n'
         try:
-            record_json = record.model_dump_json()
-            async with aiofiles.open(self.session_file, 'a', encoding='utf-8') as f:
-                await f.write(record_json + '\n')
+            await asyncio.to_thread(self._append_marker, marker)
         except Exception as e:
-            self.logger.error(f"写入操作记录失败: {e}")
+            self.logger.error(f"写入操作开始标记失败: {e}")
+
+    def _append_marker(self, marker: bytes) -> None:
+        """在工作线程中追加写入开始标记文件"""
+        with open(self.pending_file, 'ab') as f:
+            f.write(marker)
+
+    async def _flusher(self) -> None:
+        """后台批量写入：缓冲区满或超时后写入一次，缓冲区清空后退出"""
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), timeout=self.batch_timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """将缓冲区中的记录一次性追加到会话文件"""
+        async with self._write_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._append, pending)
+            except Exception as e:
+                self.logger.error(f"写入操作记录失败: {e}")
+
+    def _append(self, pending: List[bytes]) -> None:
+        """在工作线程中追加写入会话文件及索引（打开、写入、刷新合并为一次线程调度）"""
+        if self._handles is None:
+            self._handles = (open(self.session_file, 'ab', buffering=1 << 16), open(self.index_file, 'ab'))
+        fh, index_fh = self._handles
+
+        lines = [line + b'\n' for line in pending]
+        offset = fh.tell()
+        index_entries = []
+        for line in lines:
+            index_entries.append(orjson.dumps({
+                "pid": self.project_id,
+                "sf": self.session_id,
+                "off": offset,
+                "len": len(line)
+            }))
+            offset += len(line)
+
+        # 先写记录再写索引，保证索引项指向的数据已落盘
+        fh.write(b''.join(lines))
+        fh.flush()
+        index_fh.write(b'\n'.join(index_entries) + b'\n')
+        index_fh.flush()
+
+    async def __aenter__(self) -> "OperationRecorder":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType]
+    ) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """写入剩余记录（未完成的操作标记为已取消），停止后台写入任务并关闭会话文件"""
+        for record in self.active_operations.values():
+            record.cancel("关闭记录器时操作尚未完成")
+            await self._write_record(record)
+        self.active_operations.clear()
+        await self.flush()
+        if self._flusher_task and not self._flusher_task.done():
+            self._flusher_task.cancel()
+            try:
+                await self._flusher_task
+            except asyncio.CancelledError:
+                pass
+        self._flusher_task = None
+
+        async with self._write_lock:
+            if self._handles is not None:
+                (fh, index_fh), self._handles = self._handles, None
+                await asyncio.to_thread(fh.close)
+                await asyncio.to_thread(index_fh.close)
+
+        # 正常关闭后不存在未完成的操作，开始标记不再需要
+        self.pending_file.unlink(missing_ok=True)
 
     async def get_session_records(self, session_id: Optional[str] = None) -> List[OperationRecord]:
         """获取会话记录"""
         target_session = session_id or self.session_id
+        if target_session == self.session_id:
+            await self.flush()
         session_file = self.records_dir / f"session_{target_session}.jsonl"
-        
         if not session_file.exists():
-            return []
+            session_file = session_file.with_name(session_file.name + _COMPRESSED_SUFFIX)
         
         records = []
-        try:
-            async with aiofiles.open(session_file, 'r', encoding='utf-8') as f:
-                async for line in f:
-                    if line.strip():
-                        data = json.loads(line.strip())
-                        records.append(OperationRecord(**data))
-        except Exception as e:
-            self.logger.error(f"读取会话记录失败: {e}")
+        if session_file.exists():
+            try:
+                records = await asyncio.to_thread(self._load_records, session_file)
+            except Exception as e:
+                self.logger.error(f"读取会话记录失败: {e}")
         
+        # 当前会话中尚未完成的操作只在内存中
+        if target_session == self.session_id:
+            records.extend(self.active_operations.values())
         return records
 
     async def get_project_records(self, project_id: str) -> List[OperationRecord]:
         """获取项目的所有记录"""
-        all_records = []
+        await self.flush()
+        all_records = await asyncio.to_thread(self._load_project_records, project_id)
         
-        for session_file in self.records_dir.glob("session_*.jsonl"):
+        # 按时间排序
+        all_records.sort(key=lambda x: x.start_time)
+        return all_records
+
+    def _load_project_records(self, project_id: str) -> List[OperationRecord]:
+        """通过索引定位项目记录，仅读取属于该项目的记录"""
+        offsets: Dict[str, List[Tuple[int, int]]] = {}
+        indexed_sessions = set()
+        if self.index_file.exists():
+            with open(self.index_file, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+                    indexed_sessions.add(entry["sf"])
+                    if entry["pid"] == project_id:
+                        offsets.setdefault(entry["sf"], []).append((entry["off"], entry["len"]))
+
+        all_records: List[OperationRecord] = []
+        for session_id, spans in offsets.items():
+            session_file = self.records_dir / f"session_{session_id}.jsonl"
+            if not session_file.exists():
+                # 已压缩的会话文件无法按偏移读取，整体解压后过滤
+                compressed_file = session_file.with_name(session_file.name + _COMPRESSED_SUFFIX)
+                try:
+                    records = self._load_records(compressed_file)
+                    all_records.extend(r for r in records if r.project_id == project_id)
+                except Exception as e:
+                    self.logger.error(f"读取记录文件失败 {compressed_file}: {e}")
+                continue
             try:
-                async with aiofiles.open(session_file, 'r', encoding='utf-8') as f:
-                    async for line in f:
-                        if line.strip():
-                            data = json.loads(line.strip())
-                            record = OperationRecord(**data)
-                            if record.project_id == project_id:
-                                all_records.append(record)
+                fd = os.open(session_file, os.O_RDONLY)
+                try:
+                    for offset, length in spans:
+                        data = os.pread(fd, length, offset)
+                        all_records.append(OperationRecord.from_dict(orjson.loads(data)))
+                finally:
+                    os.close(fd)
             except Exception as e:
                 self.logger.error(f"读取记录文件失败 {session_file}: {e}")
-        
-        # 按时间排序
-        all_records.sort(key=lambda x: x.start_time)
+
+        # 索引建立之前的会话文件没有索引项，回退为全量扫描
+        # 只匹配最终的会话文件，跳过压缩过程中的临时文件
+        for session_file in [
+            *self.records_dir.glob("session_*.jsonl"),
+            *self.records_dir.glob(f"session_*.jsonl{_COMPRESSED_SUFFIX}"),
+        ]:
+            if _session_id_of(session_file) in indexed_sessions:
+                continue
+            try:
+                records = self._load_records(session_file)
+                all_records.extend(r for r in records if r.project_id == project_id)
+            except Exception as e:
+                self.logger.error(f"读取记录文件失败 {session_file}: {e}")
+
         return all_records
 
+    @staticmethod
+    def _load_records(session_file: Path) -> List[OperationRecord]:
+        """逐行解析JSONL记录文件（支持压缩后的会话文件）"""
+        records = []
+        opener = gzip.open if session_file.name.endswith(_COMPRESSED_SUFFIX) else open
+        with opener(session_file, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    records.append(OperationRecord.from_dict(orjson.loads(line)))
+        return records
+
+    async def compress_old_sessions(self, max_age_hours: float = 24) -> int:
+        """压缩超过指定时间未写入的历史会话文件，返回压缩的文件数"""
+        try:
+            return await asyncio.to_thread(self._compress_old_sessions, max_age_hours * 3600)
+        except Exception as e:
+            self.logger.error(f"压缩历史会话文件失败: {e}")
+            return 0
+
+    def _compress_old_sessions(self, max_age: float) -> int:
+        """在工作线程中压缩历史会话文件"""
+        cutoff = time.time() - max_age
+        compressed = 0
+        for session_file in self.records_dir.glob("session_*.jsonl"):
+            if session_file == self.session_file or session_file.stat().st_mtime > cutoff:
+                continue
+            target = session_file.with_name(session_file.name + _COMPRESSED_SUFFIX)
+            temp_file = target.with_name(target.name + ".tmp")
+            with open(session_file, 'rb') as src, gzip.open(temp_file, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(temp_file, target)
+            session_file.unlink()
+            compressed += 1
+        if compressed:
+            self.logger.info(f"已压缩 {compressed} 个历史会话文件")
+        return compressed
+
     async def get_agent_records(self, agent_name: str, project_id: Optional[str] = None) -> List[OperationRecord]:
         """获取特定智能体的记录"""
         if project_id:
@@ -361,59 +628,70 @@ class OperationRecorder:
             "project_id": project_id,
             "session_id": self.session_id,
             "total_records": len(records),
-            "records": [record.model_dump() for record in records]
+            "records": records
         }
         
-        async with aiofiles.open(output_file, 'w', encoding='utf-8') as f:
-            await f.write(json.dumps(export_data, indent=2, ensure_ascii=False))
+        async with aiofiles.open(output_file, 'wb') as f:
+            await f.write(orjson.dumps(
+                export_data,
+                default=_json_default,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS
+            ))
 
     def get_operation_stats(self, records: List[OperationRecord]) -> Dict[str, Any]:
         """获取操作统计信息"""
         if not records:
             return {}
         
+        # 单次遍历完成全部统计；计数列表依次为 [总数, 成功, 失败]
+        type_counts: Dict[OperationType, List[int]] = defaultdict(lambda: [0, 0, 0])
+        agent_counts: Dict[str, List[int]] = defaultdict(lambda: [0, 0, 0])
+        successful_operations = 0
+        duration_sum = 0.0
+        duration_count = 0
+        min_start = max_end = records[0].start_time
+        
+        for r in records:
+            outcome = 1 if r.success else 2
+            successful_operations += r.success
+            
+            counts = type_counts[r.operation_type]
+            counts[0] += 1
+            counts[outcome] += 1
+            
+            counts = agent_counts[r.actor]
+            counts[0] += 1
+            counts[outcome] += 1
+            
+            if r.duration is not None:
+                duration_sum += r.duration
+                duration_count += 1
+            
+            if r.start_time < min_start:
+                min_start = r.start_time
+            end = r.end_time or r.start_time
+            if end > max_end:
+                max_end = end
+        
         total_operations = len(records)
-        successful_operations = len([r for r in records if r.success])
-        failed_operations = total_operations - successful_operations
-        
-        # 按类型统计
-        type_stats = {}
-        for record in records:
-            op_type = record.operation_type.value
-            if op_type not in type_stats:
-                type_stats[op_type] = {"count": 0, "success": 0, "failed": 0}
-            type_stats[op_type]["count"] += 1
-            if record.success:
-                type_stats[op_type]["success"] += 1
-            else:
-                type_stats[op_type]["failed"] += 1
-        
-        # 按智能体统计
-        agent_stats = {}
-        for record in records:
-            actor = record.actor
-            if actor not in agent_stats:
-                agent_stats[actor] = {"count": 0, "success": 0, "failed": 0}
-            agent_stats[actor]["count"] += 1
-            if record.success:
-                agent_stats[actor]["success"] += 1
-            else:
-                agent_stats[actor]["failed"] += 1
-        
-        # 时间统计
-        durations = [r.duration for r in records if r.duration is not None]
-        avg_duration = sum(durations) / len(durations) if durations else 0
+        
+        def to_stats(table: Dict[str, List[int]]) -> Dict[str, Dict[str, int]]:
+            return {
+                key: {"count": count, "success": success, "failed": failed}
+                for key, (count, success, failed) in table.items()
+            }
         
         return {
             "total_operations": total_operations,
             "successful_operations": successful_operations,
-            "failed_operations": failed_operations,
-            "success_rate": successful_operations / total_operations if total_operations > 0 else 0,
-            "average_duration": avg_duration,
-            "type_statistics": type_stats,
-            "agent_statistics": agent_stats,
+            "failed_operations": total_operations - successful_operations,
+            "success_rate": successful_operations / total_operations,
+            "average_duration": duration_sum / duration_count if duration_count else 0,
+            # 操作类型在循环内直接作为键，输出时再转换为字符串值
+            "type_statistics": to_stats({op_type.value: counts for op_type, counts in type_counts.items()}),
+            "agent_statistics": to_stats(agent_counts),
             "time_range": {
-                "start": min(r.start_time for r in records).isoformat(),
-                "end": max(r.end_time or r.start_time for r in records).isoformat()
+                "start": min_start.isoformat(),
+                "end": max_end.isoformat()
             }
         }
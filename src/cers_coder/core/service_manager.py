@@ -4,8 +4,10 @@
 
 import asyncio
 import logging
+import os
+import pathlib
 from enum import Enum
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass
 
 from rich.console import Console
@@ -45,6 +47,31 @@ class ServiceInfo:
             self.dependencies = []
 
 
+# 启动摘要中的服务状态显示文本
+_STATUS_LABELS = {
+    ServiceStatus.RUNNING: "✅ 运行中",
+    ServiceStatus.DEGRADED: "⚠️  降级",
+    ServiceStatus.FAILED: "❌ 失败",
+    ServiceStatus.STOPPED: "⏹️  停止",
+}
+
+# 启动摘要中说明列的最大长度
+_DESCRIPTION_WIDTH = 50
+
+
+def _shorten(text: str, width: int) -> str:
+    """截断超长文本（中文没有空格分词，按字符截断而不使用textwrap.shorten）"""
+    return text[:width] + "..." if len(text) > width else text
+
+
+# 服务级别的启动优先级（数值越小越先启动）
+_LEVEL_PRIORITY = {
+    ServiceLevel.CORE: 0,
+    ServiceLevel.ENHANCED: 1,
+    ServiceLevel.OPTIONAL: 2,
+}
+
+
 class ServiceManager:
     """服务管理器"""
     
@@ -60,6 +87,9 @@ class ServiceManager:
         self.system_status = ServiceStatus.UNKNOWN
         self.failed_services: Set[str] = set()
         self.degraded_services: Set[str] = set()
+        
+        # 启动事件（服务名, 状态, 错误信息），按完成顺序记录，启动结束后统一展示
+        self._start_events: List[Tuple[str, ServiceStatus, Optional[str]]] = []
 
     def register_service(
         self,
@@ -80,12 +110,11 @@ class ServiceManager:
     async def start_all_services(self) -> bool:
         """启动所有服务"""
         self.console.print(Panel.fit("🚀 启动系统服务", style="bold blue"))
+        self._start_events.clear()
         
-        # 按依赖顺序启动服务
-        start_order = self._get_start_order()
-        
-        for service_name in start_order:
-            await self._start_service(service_name)
+        # 按依赖分层启动服务，同一层内的服务互不依赖，并发启动
+        for layer in self._get_start_layers():
+            await asyncio.gather(*(self._start_service(name) for name in layer))
         
         # 评估系统状态
         self._evaluate_system_status()
@@ -104,7 +133,6 @@ class ServiceManager:
         
         try:
             service.status = ServiceStatus.STARTING
-            self.console.print(f"启动服务: {service_name}...", end="")
             
             # 检查依赖
             for dep in service.dependencies:
@@ -115,7 +143,7 @@ class ServiceManager:
                     else:
                         service.status = ServiceStatus.DEGRADED
                         self.degraded_services.add(service_name)
-                        self.console.print(" ⚠️  降级运行", style="yellow")
+                        self._record_start_event(service_name, service.status, f"依赖不可用: {dep}")
                         return True
             
             # 启动服务
@@ -123,7 +151,7 @@ class ServiceManager:
             
             if success:
                 service.status = ServiceStatus.RUNNING
-                self.console.print(" ✅", style="green")
+                self._record_start_event(service_name, service.status)
                 return True
             else:
                 raise Exception("服务初始化失败")
@@ -132,13 +160,18 @@ class ServiceManager:
             service.status = ServiceStatus.FAILED
             service.error_message = str(e)
             self.failed_services.add(service_name)
+            self._record_start_event(service_name, service.status, str(e))
             
-            if service.level == ServiceLevel.CORE:
-                self.console.print(f" ❌ {e}", style="red")
-                return False
-            else:
-                self.console.print(f" ⚠️  跳过 ({e})", style="yellow")
-                return True
+            # 非核心服务失败时跳过，不影响系统启动
+            return service.level != ServiceLevel.CORE
+
+    def _record_start_event(self, service_name: str, status: ServiceStatus, error: Optional[str] = None) -> None:
+        """记录服务启动结果（仅写结构化日志，控制台展示在启动结束后统一进行）"""
+        self._start_events.append((service_name, status, error))
+        self.logger.info(
+            "service_start",
+            extra={"service": service_name, "status": status.value, "error": error}
+        )
 
     async def _initialize_service(self, service_name: str) -> bool:
         """初始化具体服务"""
@@ -151,7 +184,6 @@ class ServiceManager:
             elif service_name == "ollama_client":
                 try:
                     from ..llm.ollama_client import OllamaClient
-                    import os
                     client = OllamaClient(host=os.getenv("OLLAMA_HOST", "http://localhost:11434"))
                     # 健康检查
                     if await client.health_check():
@@ -171,10 +203,8 @@ class ServiceManager:
                 
             elif service_name == "state_manager":
                 from ..core.state_manager import StateManager
-                import os
                 state_dir = os.getenv("STATE_DIR", "./state")
                 # 确保目录存在
-                import pathlib
                 pathlib.Path(state_dir).mkdir(parents=True, exist_ok=True)
                 self.service_instances[service_name] = StateManager(state_dir=state_dir)
                 return True
@@ -197,34 +227,43 @@ class ServiceManager:
 
     def _get_start_order(self) -> List[str]:
         """获取服务启动顺序（拓扑排序）"""
-        # 简化的拓扑排序
-        visited = set()
-        order = []
+        return [name for layer in self._get_start_layers() for name in layer]
+
+    def _get_start_layers(self) -> List[List[str]]:
+        """按依赖分层（Kahn算法），同一层内的服务互不依赖，层内核心服务优先"""
+        in_degree: Dict[str, int] = {}
+        dependents: Dict[str, List[str]] = {name: [] for name in self.services}
+        for name, service in self.services.items():
+            deps = {dep for dep in service.dependencies if dep in self.services}
+            in_degree[name] = len(deps)
+            for dep in deps:
+                dependents[dep].append(name)
         
-        def visit(service_name: str):
-            if service_name in visited:
-                return
-            visited.add(service_name)
-            
-            service = self.services.get(service_name)
-            if service:
-                for dep in service.dependencies:
-                    if dep in self.services:
-                        visit(dep)
-                order.append(service_name)
+        # 注册顺序作为同级别服务的次序
+        rank = {
+            name: (_LEVEL_PRIORITY[service.level], index)
+            for index, (name, service) in enumerate(self.services.items())
+        }
         
-        # 按服务级别排序，核心服务优先
-        core_services = [name for name, service in self.services.items() 
-                        if service.level == ServiceLevel.CORE]
-        enhanced_services = [name for name, service in self.services.items() 
-                           if service.level == ServiceLevel.ENHANCED]
-        optional_services = [name for name, service in self.services.items() 
-                           if service.level == ServiceLevel.OPTIONAL]
+        layers = []
+        ready = sorted((name for name, degree in in_degree.items() if degree == 0), key=rank.__getitem__)
+        while ready:
+            layers.append(ready)
+            next_ready = []
+            for name in ready:
+                for dependent in dependents[name]:
+                    in_degree[dependent] -= 1
+                    if in_degree[dependent] == 0:
+                        next_ready.append(dependent)
+            ready = sorted(next_ready, key=rank.__getitem__)
         
-        for service_name in core_services + enhanced_services + optional_services:
-            visit(service_name)
+        # 存在循环依赖的服务放在最后，启动时按依赖检查结果降级或失败
+        remaining = sorted((name for name, degree in in_degree.items() if degree > 0), key=rank.__getitem__)
+        if remaining:
+            self.logger.warning(f"检测到循环依赖: {remaining}")
+            layers.append(remaining)
         
-        return order
+        return layers
 
     def _evaluate_system_status(self) -> None:
         """评估系统状态"""
@@ -249,22 +288,17 @@ class ServiceManager:
         table.add_column("状态", style="green")
         table.add_column("说明", style="yellow")
         
-        for name, service in self.services.items():
-            status_icon = {
-                ServiceStatus.RUNNING: "✅ 运行中",
-                ServiceStatus.DEGRADED: "⚠️  降级",
-                ServiceStatus.FAILED: "❌ 失败",
-                ServiceStatus.STOPPED: "⏹️  停止"
-            }.get(service.status, "❓ 未知")
-            
-            description = service.error_message if service.error_message else "正常"
-            
-            table.add_row(
+        rows = [
+            (
                 name,
-                service.level.value,
-                status_icon,
-                description[:50] + "..." if len(description) > 50 else description
+                self.services[name].level.value,
+                _STATUS_LABELS.get(status, "❓ 未知"),
+                _shorten(error or "正常", _DESCRIPTION_WIDTH)
             )
+            for name, status, error in self._start_events
+        ]
+        for row in rows:
+            table.add_row(*row)
         
         self.console.print(table)
         
@@ -2,21 +2,28 @@
 状态管理器 - 负责系统状态的持久化和恢复
 """
 
-import json
+import asyncio
+import gzip
 import logging
 import os
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
 from uuid import UUID, uuid4
 
-import aiofiles
-from pydantic import BaseModel, Field
+import orjson
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
+
+# 没有内部辅助方法维护、调用方可能直接原地修改的容器字段，保存时总是重新序列化
+_UNTRACKED_FIELDS = frozenset({"input_files", "requirements", "architecture", "outputs", "artifacts", "metadata"})
 
 
 class ProjectState(BaseModel):
     """项目状态模型"""
     
+    # 延迟构建校验器；赋值时不重新校验，未知字段（如快照中的增量序号）忽略
+    model_config = ConfigDict(defer_build=True, validate_assignment=False, extra='ignore')
+    
     id: str = Field(default_factory=lambda: str(uuid4()), description="项目ID")
     name: str = Field(..., description="项目名称")
     description: str = Field(default="", description="项目描述")
@@ -55,6 +62,34 @@ class ProjectState(BaseModel):
     
     # 元数据
     metadata: Dict[str, Any] = Field(default_factory=dict, description="元数据")
+    
+    # 序列化缓存：字段名 -> JSON模式的序列化结果，保存时只重新序列化修改过的字段
+    _dump_cache: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _dirty_fields: Optional[Set[str]] = PrivateAttr(default=None)  # None 表示全部字段都需要序列化
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if not name.startswith("_") and self._dirty_fields is not None:
+            self._dirty_fields.add(name)
+
+    def mark_dirty(self, *field_names: str) -> None:
+        """标记字段已被原地修改（内部辅助方法修改列表/字典内容后调用）"""
+        if self._dirty_fields is not None:
+            self._dirty_fields.update(field_names)
+
+    def dump_json_dict(self) -> Dict[str, Any]:
+        """JSON模式序列化，未修改的字段复用上次的序列化结果
+
+        调用方可能直接原地修改的容器字段（见 _UNTRACKED_FIELDS）每次都重新序列化。
+        """
+        if self._dirty_fields is None:
+            self._dump_cache = self.model_dump(mode='json')
+        else:
+            self._dump_cache.update(
+                self.model_dump(mode='json', include=self._dirty_fields | _UNTRACKED_FIELDS)
+            )
+        self._dirty_fields = set()
+        return dict(self._dump_cache)
 
     def update_progress(self, progress: float) -> None:
         """更新进度"""
@@ -73,6 +108,7 @@ class ProjectState(BaseModel):
             "error": error,
             "details": details or {}
         })
+        self.mark_dirty("errors")
         self.updated_at = datetime.now()
 
     def add_warning(self, warning: str, details: Optional[Dict[str, Any]] = None) -> None:
@@ -82,9 +118,128 @@ class ProjectState(BaseModel):
             "warning": warning,
             "details": details or {}
         })
+        self.mark_dirty("warnings")
         self.updated_at = datetime.now()
 
 
+async def _read_bytes(path: Path) -> bytes:
+    """读取整个文件，只占用一次线程池调度"""
+    return await asyncio.to_thread(path.read_bytes)
+
+
+def _append_bytes_sync(path: Path, data: bytes) -> None:
+    """同步追加写入文件"""
+    with open(path, 'ab') as f:
+        f.write(data)
+
+
+def _write_bytes_sync(path: Path, data: bytes) -> None:
+    """同步原子写入文件：先写临时文件并落盘，再替换目标文件
+
+    写入中途崩溃只会留下临时文件，原文件保持完整。
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+async def _write_bytes(path: Path, data: bytes) -> None:
+    """写入状态/检查点文件，整个写入只占用一次线程池调度"""
+    await asyncio.to_thread(_write_bytes_sync, path, data)
+
+
+# 增量日志条数超过该值时写入一次完整快照并清空日志
+_COMPACT_THRESHOLD = 256
+
+
+# orjson 序列化选项：快照/检查点缩进便于查看，增量日志每条记录一行
+_SNAPSHOT_OPTS = orjson.OPT_INDENT_2
+_DELTA_OPTS = orjson.OPT_APPEND_NEWLINE
+
+
+# ProjectState 中需要从ISO字符串还原的时间字段
+_DATETIME_FIELDS = ("created_at", "updated_at", "started_at", "completed_at")
+
+
+def _state_from_data(data: Dict[str, Any], trusted: bool = True) -> ProjectState:
+    """从状态文件数据创建项目状态，trusted=True 时跳过校验只还原时间字段"""
+    if not trusted:
+        return ProjectState(**data)
+    for name in _DATETIME_FIELDS:
+        value = data.get(name)
+        if isinstance(value, str):
+            data[name] = datetime.fromisoformat(value)
+    return ProjectState.model_construct(**data)
+
+
+def _delta_file_of(state_file: Path) -> Path:
+    """状态文件对应的增量日志文件"""
+    return state_file.with_suffix(".deltas.jsonl")
+
+
+# 项目摘要文件后缀及其包含的字段，列出项目时只读取摘要，不解析完整状态
+_SUMMARY_SUFFIX = ".summary.json"
+_SUMMARY_FIELDS = ("id", "name", "status", "progress", "created_at", "updated_at")
+
+
+def _summary_file_of(state_file: Path) -> Path:
+    """状态文件对应的摘要文件"""
+    return state_file.with_suffix(_SUMMARY_SUFFIX)
+
+
+# 输入文件内容单独压缩保存到旁路文件，只在内容变化时重写，快照中只保留文件名
+_INPUTS_SUFFIX = ".inputs.json.gz"
+_INPUTS_COMPRESSLEVEL = 6
+
+
+def _inputs_file_of(state_file: Path) -> Path:
+    """状态文件对应的输入文件内容压缩文件"""
+    return state_file.with_suffix(_INPUTS_SUFFIX)
+
+
+def _write_inputs_sync(path: Path, input_files: Dict[str, str]) -> None:
+    """同步压缩并写入输入文件内容"""
+    _write_bytes_sync(path, gzip.compress(orjson.dumps(input_files), compresslevel=_INPUTS_COMPRESSLEVEL))
+
+
+def _read_inputs_sync(path: Path) -> Dict[str, str]:
+    """同步读取并解压输入文件内容"""
+    input_files: Dict[str, str] = orjson.loads(gzip.decompress(path.read_bytes()))
+    return input_files
+
+
+# 附属于项目状态文件的文件后缀，清理时与状态文件一起删除
+_SIDE_SUFFIXES = (_SUMMARY_SUFFIX, ".deltas.jsonl", _INPUTS_SUFFIX)
+
+
+def _summary_of(data: Dict[str, Any]) -> Dict[str, Any]:
+    """从状态数据中提取列表展示所需的字段"""
+    summary = {name: data.get(name) for name in _SUMMARY_FIELDS}
+    summary["progress"] = data.get("progress", 0)
+    return summary
+
+
+def _apply_delta(state: ProjectState, op: str, args: Dict[str, Any]) -> None:
+    """将一条增量修改应用到项目状态"""
+    if op == "add_task":
+        state.tasks.append(args["task"])
+        state.mark_dirty("tasks")
+    elif op == "complete_task":
+        state.completed_tasks.append(args["task_id"])
+        state.mark_dirty("completed_tasks")
+    elif op == "fail_task":
+        state.failed_tasks.append(args["task_id"])
+        state.mark_dirty("failed_tasks")
+    elif op == "update_agents_status":
+        state.agents_status.update(args["statuses"])
+        state.mark_dirty("agents_status")
+    else:
+        raise ValueError(f"未知的增量操作: {op}")
+
+
 class StateManager:
     """状态管理器"""
     
@@ -96,9 +251,25 @@ class StateManager:
         # 当前项目状态
         self._current_state: Optional[ProjectState] = None
         self._state_file: Optional[Path] = None
+        
+        # 延迟写入：save_state 只标记状态已修改，由后台任务合并一段时间内的修改后写入一次
+        self.save_interval = 0.25
+        self._dirty = False
+        self._save_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        
+        # 增量日志：任务与智能体状态的修改逐条追加，快照写入后清空
+        self._delta_seq = 0
+        self._delta_count = 0
+        
+        # 最近一次写入旁路文件的输入文件内容（序列化缓存中的同一对象），用于跳过未变化的重写
+        self._inputs_written: Optional[Dict[str, str]] = None
 
     async def create_project(self, name: str, description: str = "") -> ProjectState:
         """创建新项目"""
+        # 切换项目前写入上一个项目未保存的修改
+        await self.flush()
+        
         project_state = ProjectState(
             name=name,
             description=description,
@@ -108,15 +279,19 @@ class StateManager:
         # 设置状态文件路径
         self._state_file = self.state_dir / f"{project_state.id}.json"
         self._current_state = project_state
+        self._delta_seq = 0
+        self._delta_count = 0
+        self._inputs_written = None
         
-        # 保存初始状态
-        await self.save_state()
+        # 立即保存初始状态，保证项目文件创建后即可被加载
+        await self._do_save()
         
         self.logger.info(f"创建新项目: {name} (ID: {project_state.id})")
         return project_state
 
-    async def load_project(self, project_id: str) -> Optional[ProjectState]:
-        """加载项目状态"""
+    async def load_project(self, project_id: str, trusted: bool = True) -> Optional[ProjectState]:
+        """加载项目状态（trusted=False 时对文件内容做完整校验）"""
+        await self.flush()
         state_file = self.state_dir / f"{project_id}.json"
         
         if not state_file.exists():
@@ -124,13 +299,35 @@ class StateManager:
             return None
         
         try:
-            async with aiofiles.open(state_file, 'r', encoding='utf-8') as f:
-                content = await f.read()
-                data = json.loads(content)
-                
-            project_state = ProjectState(**data)
+            data = orjson.loads(await _read_bytes(state_file))
+            inputs_name = data.pop("_input_files", None)
+            if inputs_name:
+                try:
+                    data["input_files"] = await asyncio.to_thread(_read_inputs_sync, self.state_dir / inputs_name)
+                except FileNotFoundError:
+                    self.logger.warning(f"输入文件内容缺失，项目将不包含输入文件: {inputs_name}")
+            project_state = _state_from_data(data, trusted)
+            
+            # 重放快照之后追加的增量修改
+            snapshot_seq = delta_seq = data.get("_delta_seq", 0)
+            delta_count = 0
+            delta_file = _delta_file_of(state_file)
+            if delta_file.exists():
+                for line in (await _read_bytes(delta_file)).splitlines():
+                    if not line.strip():
+                        continue
+                    delta = orjson.loads(line)
+                    if delta["seq"] <= snapshot_seq:
+                        continue
+                    _apply_delta(project_state, delta["op"], delta["args"])
+                    delta_seq = delta["seq"]
+                    delta_count += 1
+            
             self._current_state = project_state
             self._state_file = state_file
+            self._delta_seq = delta_seq
+            self._delta_count = delta_count
+            self._inputs_written = None
             
             self.logger.info(f"加载项目状态: {project_state.name} (ID: {project_id})")
             return project_state
@@ -140,21 +337,72 @@ class StateManager:
             return None
 
     async def save_state(self) -> bool:
-        """保存当前状态"""
+        """标记当前状态需要保存，由后台任务延迟合并写入"""
         if not self._current_state or not self._state_file:
             self.logger.warning("没有当前状态或状态文件路径")
             return False
         
+        # 更新时间戳
+        self._current_state.updated_at = datetime.now()
+        
+        self._dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flusher())
+        return True
+
+    async def _flusher(self) -> None:
+        """后台写入：等待一个写入间隔后保存，期间的多次修改只写一次"""
+        while self._dirty:
+            await asyncio.sleep(self.save_interval)
+            await self.flush()
+
+    async def flush(self) -> bool:
+        """立即写入未保存的修改"""
+        async with self._save_lock:
+            if not self._dirty:
+                return True
+            self._dirty = False
+            return await self._do_save()
+
+    async def close(self) -> None:
+        """写入未保存的修改并停止后台写入任务"""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush()
+
+    async def _do_save(self) -> bool:
+        """将当前状态写入文件"""
+        if not self._current_state or not self._state_file:
+            return False
+        
         try:
-            # 更新时间戳
-            self._current_state.updated_at = datetime.now()
+            # 序列化状态，记录快照已包含的增量序号
+            data = self._current_state.dump_json_dict()
+            data["_delta_seq"] = self._delta_seq
+            
+            # 输入文件内容写入压缩旁路文件，内容未变化时不重写
+            input_files = data.get("input_files")
+            if input_files:
+                inputs_file = _inputs_file_of(self._state_file)
+                if input_files != self._inputs_written:
+                    await asyncio.to_thread(_write_inputs_sync, inputs_file, input_files)
+                    self._inputs_written = dict(input_files)
+                del data["input_files"]
+                data["_input_files"] = inputs_file.name
             
-            # 序列化状态
-            data = self._current_state.model_dump(mode='json')
+            # 写入文件，并同步更新摘要文件
+            await _write_bytes(self._state_file, orjson.dumps(data, option=_SNAPSHOT_OPTS))
+            await _write_bytes(_summary_file_of(self._state_file), orjson.dumps(_summary_of(data)))
             
-            # 写入文件
-            async with aiofiles.open(self._state_file, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(data, indent=2, ensure_ascii=False))
+            # 快照已包含全部增量修改，清空增量日志
+            if self._delta_count:
+                _delta_file_of(self._state_file).unlink(missing_ok=True)
+                self._delta_count = 0
             
             self.logger.debug(f"保存状态到: {self._state_file}")
             return True
@@ -170,10 +418,9 @@ class StateManager:
         
         try:
             checkpoint_file = self.state_dir / f"{self._current_state.id}_checkpoint_{name}.json"
-            data = self._current_state.model_dump(mode='json')
+            data = self._current_state.dump_json_dict()
             
-            async with aiofiles.open(checkpoint_file, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(data, indent=2, ensure_ascii=False))
+            await _write_bytes(checkpoint_file, orjson.dumps(data, option=_SNAPSHOT_OPTS))
             
             self.logger.info(f"创建检查点: {name}")
             return True
@@ -182,8 +429,8 @@ class StateManager:
             self.logger.error(f"创建检查点失败: {e}", exc_info=True)
             return False
 
-    async def restore_checkpoint(self, name: str) -> bool:
-        """恢复检查点"""
+    async def restore_checkpoint(self, name: str, trusted: bool = True) -> bool:
+        """恢复检查点（trusted=False 时对文件内容做完整校验）"""
         if not self._current_state:
             return False
         
@@ -194,12 +441,12 @@ class StateManager:
                 self.logger.warning(f"检查点文件不存在: {checkpoint_file}")
                 return False
             
-            async with aiofiles.open(checkpoint_file, 'r', encoding='utf-8') as f:
-                content = await f.read()
-                data = json.loads(content)
+            data = orjson.loads(await _read_bytes(checkpoint_file))
+            self._current_state = _state_from_data(data, trusted)
             
-            self._current_state = ProjectState(**data)
-            await self.save_state()
+            # 立即写入快照，使增量日志中恢复前的修改失效
+            self._current_state.updated_at = datetime.now()
+            await self.compact()
             
             self.logger.info(f"恢复检查点: {name}")
             return True
@@ -214,69 +461,140 @@ class StateManager:
 
     async def update_agent_status(self, agent_name: str, status: Dict[str, Any]) -> None:
         """更新智能体状态"""
-        if self._current_state:
-            self._current_state.agents_status[agent_name] = status
-            await self.save_state()
+        await self._record_delta("update_agents_status", {"statuses": {agent_name: status}})
+
+    async def update_agents_status(self, statuses: Dict[str, Dict[str, Any]]) -> None:
+        """批量更新智能体状态，只写一条增量记录"""
+        if statuses:
+            await self._record_delta("update_agents_status", {"statuses": statuses})
 
     async def add_task(self, task: Dict[str, Any]) -> None:
         """添加任务"""
-        if self._current_state:
-            self._current_state.tasks.append(task)
-            await self.save_state()
+        await self._record_delta("add_task", {"task": task})
 
     async def complete_task(self, task_id: str) -> None:
         """完成任务"""
-        if self._current_state:
-            self._current_state.completed_tasks.append(task_id)
-            await self.save_state()
+        await self._record_delta("complete_task", {"task_id": task_id})
 
     async def fail_task(self, task_id: str) -> None:
         """任务失败"""
-        if self._current_state:
-            self._current_state.failed_tasks.append(task_id)
+        await self._record_delta("fail_task", {"task_id": task_id})
+
+    async def _record_delta(self, op: str, args: Dict[str, Any]) -> None:
+        """应用修改并追加到增量日志（代替重写完整状态）"""
+        if not self._current_state or not self._state_file:
+            return
+        
+        # 修改、序号递增和追加写入在同一临界区内完成，避免并发的快照写入
+        # 已包含该修改却记录旧序号，导致加载时重复重放
+        async with self._save_lock:
+            if not self._current_state or not self._state_file:
+                return
+            _apply_delta(self._current_state, op, args)
+            self._current_state.updated_at = datetime.now()
+            self._delta_seq += 1
+            line = orjson.dumps({"seq": self._delta_seq, "op": op, "args": args}, default=str, option=_DELTA_OPTS)
+            try:
+                await asyncio.to_thread(_append_bytes_sync, _delta_file_of(self._state_file), line)
+                self._delta_count += 1
+            except Exception as e:
+                self.logger.error(f"写入增量日志失败: {e}")
+                # 增量写入失败时退回到完整快照
+                self._dirty = True
+        
+        # 增量日志过长时压缩为快照
+        if self._delta_count >= _COMPACT_THRESHOLD or self._dirty:
             await self.save_state()
 
+    async def compact(self) -> bool:
+        """写入完整快照并清空增量日志"""
+        if not self._current_state or not self._state_file:
+            return False
+        self._dirty = True
+        return await self.flush()
+
     async def list_projects(self) -> List[Dict[str, Any]]:
         """列出所有项目"""
-        projects = []
+        await self.flush()
         
-        for state_file in self.state_dir.glob("*.json"):
-            # 跳过检查点文件
-            if "_checkpoint_" in state_file.name:
+        # scandir 直接给出文件名和类型，跳过检查点文件
+        project_files: Dict[str, Path] = {}
+        summary_files: Dict[str, Path] = {}
+        for entry in os.scandir(self.state_dir):
+            name = entry.name
+            if not name.endswith(".json") or "_checkpoint_" in name or not entry.is_file():
                 continue
-                
-            try:
-                async with aiofiles.open(state_file, 'r', encoding='utf-8') as f:
-                    content = await f.read()
-                    data = json.loads(content)
-                
-                projects.append({
-                    "id": data.get("id"),
-                    "name": data.get("name"),
-                    "status": data.get("status"),
-                    "progress": data.get("progress", 0),
-                    "created_at": data.get("created_at"),
-                    "updated_at": data.get("updated_at")
-                })
-                
-            except Exception as e:
-                self.logger.warning(f"读取项目文件失败 {state_file}: {e}")
+            if name.endswith(_SUMMARY_SUFFIX):
+                summary_files[name[:-len(_SUMMARY_SUFFIX)]] = Path(entry.path)
+            else:
+                project_files[name[:-len(".json")]] = Path(entry.path)
+        
+        # 优先读取摘要文件，没有摘要的旧项目读取完整状态文件
+        state_files = [
+            summary_files.get(project_id, state_file)
+            for project_id, state_file in project_files.items()
+        ]
+        
+        # 并发读取所有项目文件
+        results = await asyncio.gather(
+            *(self._read_project_summary(state_file) for state_file in state_files),
+            return_exceptions=True
+        )
+        
+        projects = []
+        for state_file, result in zip(state_files, results):
+            if isinstance(result, BaseException):
+                self.logger.warning(f"读取项目文件失败 {state_file}: {result}")
                 continue
+            projects.append(result)
         
         return sorted(projects, key=lambda x: x.get("updated_at", ""), reverse=True)
 
+    async def _read_project_summary(self, state_file: Path) -> Dict[str, Any]:
+        """读取项目摘要或状态文件中用于列表展示的字段"""
+        return _summary_of(orjson.loads(await _read_bytes(state_file)))
+
     async def cleanup_old_states(self, days: int = 30) -> int:
-        """清理旧的状态文件"""
+        """清理旧的状态文件
+
+        摘要、增量日志和输入文件随所属的项目状态文件一起清理，按整组文件中最新的修改时间判断；
+        当前项目不会被清理。
+        """
         cutoff_time = datetime.now().timestamp() - (days * 24 * 3600)
         cleaned_count = 0
         
-        for state_file in self.state_dir.glob("*.json"):
+        # 按所属的项目状态文件分组
+        groups: Dict[Path, List[Path]] = {}
+        for entry in os.scandir(self.state_dir):
+            if not entry.is_file():
+                continue
+            name = entry.name
+            for suffix in _SIDE_SUFFIXES:
+                if name.endswith(suffix):
+                    owner = self.state_dir / f"{name[:-len(suffix)]}.json"
+                    break
+            else:
+                if not name.endswith(".json"):
+                    continue
+                owner = Path(entry.path)
+            groups.setdefault(owner, []).append(Path(entry.path))
+        
+        for owner, files in groups.items():
+            if owner == self._state_file:
+                continue
             try:
-                if state_file.stat().st_mtime < cutoff_time:
-                    state_file.unlink()
+                if max(path.stat().st_mtime for path in files) >= cutoff_time:
+                    continue
+            except OSError as e:
+                self.logger.warning(f"读取文件信息失败 {owner}: {e}")
+                continue
+            
+            for path in files:
+                try:
+                    path.unlink()
                     cleaned_count += 1
-                    self.logger.info(f"清理旧状态文件: {state_file}")
-            except Exception as e:
-                self.logger.warning(f"清理文件失败 {state_file}: {e}")
+                    self.logger.info(f"清理旧状态文件: {path}")
+                except Exception as e:
+                    self.logger.warning(f"清理文件失败 {path}: {e}")
         
         return cleaned_count
@@ -4,12 +4,13 @@
 
 import asyncio
 import logging
+from array import array
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Container, Dict, Iterable, List, Optional, Set
 from uuid import uuid4
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from .base_agent import BaseAgent
 from .message import Message, MessageType, create_task_message
@@ -32,11 +33,15 @@ class WorkflowPhase(str, Enum):
 
 class TaskDefinition(BaseModel):
     """任务定义"""
+    
+    # 延迟构建校验器；赋值时不重新校验，未知字段忽略
+    model_config = ConfigDict(defer_build=True, validate_assignment=False, extra='ignore')
+    
     id: str = Field(default_factory=lambda: str(uuid4()), description="任务ID")
     name: str = Field(..., description="任务名称")
     description: str = Field(..., description="任务描述")
-    phase: WorkflowPhase = Field(..., description="所属阶段")
-    agent_type: str = Field(..., description="负责的智能体类型")
+    phase: WorkflowPhase = Field(..., frozen=True, description="所属阶段")
+    agent_type: str = Field(..., frozen=True, description="负责的智能体类型")
     dependencies: List[str] = Field(default_factory=list, description="依赖的任务ID")
     inputs: Dict[str, Any] = Field(default_factory=dict, description="输入数据")
     outputs: Dict[str, Any] = Field(default_factory=dict, description="输出数据")
@@ -51,10 +56,72 @@ class TaskDefinition(BaseModel):
     error_message: Optional[str] = Field(None, description="错误信息")
 
 
+def _check_dependencies(tasks: Iterable[TaskDefinition], known_ids: Container[str]) -> None:
+    """校验任务依赖都指向已知任务，存在未知依赖时抛出 ValueError"""
+    unknown = [
+        f"{task.id} -> {dep_id}"
+        for task in tasks
+        for dep_id in task.dependencies if dep_id not in known_ids
+    ]
+    if unknown:
+        raise ValueError(f"任务依赖不存在的任务: {', '.join(unknown)}")
+
+
+def batch_topsort(tasks: List[TaskDefinition]) -> List[List[TaskDefinition]]:
+    """按依赖层级对任务分批（Kahn算法）
+
+    返回的每一批任务之间互不依赖，可以并发执行；依赖不在任务集合内时抛出 ValueError。
+    """
+    task_map = {task.id: task for task in tasks}
+    _check_dependencies(tasks, task_map)
+    order = {task.id: index for index, task in enumerate(tasks)}
+
+    # 多数任务没有依赖：直接作为第一批，只为有依赖的任务维护入度和后继表
+    roots: List[str] = []
+    in_degree: Dict[str, int] = {}
+    successors: Dict[str, List[str]] = {}
+    for task in tasks:
+        for dep_id in task.dependencies:
+            successors.setdefault(dep_id, []).append(task.id)
+        if task.dependencies:
+            in_degree[task.id] = len(task.dependencies)
+        else:
+            roots.append(task.id)
+
+    waves: List[List[TaskDefinition]] = []
+    current = roots
+    visited = 0
+
+    while current:
+        waves.append([task_map[task_id] for task_id in current])
+        visited += len(current)
+
+        next_wave = []
+        for task_id in current:
+            for succ_id in successors.get(task_id, ()):
+                in_degree[succ_id] -= 1
+                if in_degree[succ_id] == 0:
+                    next_wave.append(succ_id)
+        # 批次内保持任务的原始顺序
+        current = sorted(next_wave, key=order.__getitem__)
+
+    if visited != len(task_map):
+        # 列出仍未解除的依赖边，便于定位循环
+        blocked = {task_id for task_id, degree in in_degree.items() if degree > 0}
+        edges = [
+            f"{dep_id} -> {task.id}"
+            for task in tasks if task.id in blocked
+            for dep_id in task.dependencies if dep_id in blocked
+        ]
+        raise ValueError(f"任务依赖存在循环: {', '.join(edges)}")
+
+    return waves
+
+
 class WorkflowController:
     """工作流控制器"""
     
-    def __init__(self, state_manager: StateManager):
+    def __init__(self, state_manager: StateManager, max_parallel: int = 4):
         self.state_manager = state_manager
         self.logger = logging.getLogger("workflow_controller")
         
@@ -66,6 +133,13 @@ class WorkflowController:
         self.task_queue: asyncio.Queue[str] = asyncio.Queue()
         self.running_tasks: Set[str] = set()
         
+        # 依赖图：任务ID在构建时映射为整数下标，后继表和未完成依赖数按下标存储
+        self._task_ids: List[str] = []
+        self._task_index: Dict[str, int] = {}
+        self._dependents: List[List[int]] = []
+        self._deps_remaining: array = array('i')
+        self._graph_ready = False
+        
         # 工作流状态
         self.current_phase = WorkflowPhase.INITIALIZATION
         self.is_running = False
@@ -73,16 +147,61 @@ class WorkflowController:
         
         # 事件
         self._stop_event = asyncio.Event()
-        self._pause_event = asyncio.Event()
+        # 未暂停时置位，暂停时清除，工作协程在此等待恢复
+        self._resume_event = asyncio.Event()
         
-        # 任务执行器
-        self._task_executor: Optional[asyncio.Task] = None
+        # 任务执行器：多个工作协程并发消费任务队列
+        self.max_parallel = max(1, max_parallel)
+        self._workers: List[asyncio.Task] = []
 
     def register_agent(self, agent_type: str, agent: BaseAgent) -> None:
         """注册智能体"""
         self.agents[agent_type] = agent
+        agent.response_handler = self._handle_agent_response
         self.logger.info(f"注册智能体: {agent_type} -> {agent.name}")
 
+    async def _handle_agent_response(self, response: Message) -> None:
+        """接收智能体对任务消息的响应"""
+        self.logger.info(f"收到智能体响应: {response.sender} -> {response.subject}")
+
+    def register_task(self, task: TaskDefinition) -> None:
+        """注册单个任务"""
+        self.register_tasks([task])
+
+    def register_tasks(self, tasks: List[TaskDefinition]) -> None:
+        """注册任务
+
+        工作流运行中注册的任务会加入依赖图，依赖已满足时立即加入队列；
+        依赖不存在或存在循环时抛出 ValueError，不注册任何任务。
+        """
+        merged = {**self.tasks, **{task.id: task for task in tasks}}
+        batch_topsort(list(merged.values()))
+        
+        new_tasks: List[TaskDefinition] = []
+        replaced = False
+        for task in tasks:
+            current = self.tasks.get(task.id)
+            if current is None:
+                new_tasks.append(task)
+            elif current is not task:
+                replaced = True
+        self.tasks.update((task.id, task) for task in tasks)
+        
+        if not self._graph_ready:
+            return
+        
+        # 替换已有任务可能改变依赖关系，重建依赖图；否则只追加新任务
+        if replaced:
+            self._build_dep_graph()
+            self._enqueue_ready_tasks()
+            return
+        
+        self._add_to_dep_graph(new_tasks)
+        for task in new_tasks:
+            if task.status == "pending" and self._deps_remaining[self._task_index[task.id]] == 0:
+                self.task_queue.put_nowait(task.id)
+                task.status = "queued"
+
     def create_default_workflow(self) -> List[TaskDefinition]:
         """创建默认工作流"""
         tasks = [
@@ -207,7 +326,7 @@ class WorkflowController:
         # 为任务分配ID并注册
         for task in tasks:
             task.id = task.name  # 使用名称作为ID，简化依赖关系
-            self.tasks[task.id] = task
+        self.register_tasks(tasks)
         
         return tasks
 
@@ -221,7 +340,7 @@ class WorkflowController:
         self.is_running = True
         self.is_paused = False
         self._stop_event.clear()
-        self._pause_event.clear()
+        self._resume_event.set()
         
         # 启动所有智能体
         for agent in self.agents.values():
@@ -231,11 +350,17 @@ class WorkflowController:
         if not self.tasks:
             self.create_default_workflow()
         
+        # 构建依赖图
+        self._build_dep_graph()
+        
         # 启动任务执行器
-        self._task_executor = asyncio.create_task(self._task_execution_loop())
+        self._workers = [
+            asyncio.create_task(self._worker_loop())
+            for _ in range(self.max_parallel)
+        ]
         
         # 将准备就绪的任务加入队列
-        await self._enqueue_ready_tasks()
+        self._enqueue_ready_tasks()
 
     async def stop_workflow(self) -> None:
         """停止工作流"""
@@ -244,19 +369,21 @@ class WorkflowController:
         
         self.logger.info("停止工作流")
         self.is_running = False
+        self._graph_ready = False
         self._stop_event.set()
         
         # 停止任务执行器
-        if self._task_executor:
-            self._task_executor.cancel()
-            try:
-                await self._task_executor
-            except asyncio.CancelledError:
-                pass
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
         
         # 停止所有智能体
         for agent in self.agents.values():
             await agent.stop()
+        
+        # 写入未保存的状态
+        await self.state_manager.close()
 
     async def pause_workflow(self) -> None:
         """暂停工作流"""
@@ -265,7 +392,7 @@ class WorkflowController:
         
         self.logger.info("暂停工作流")
         self.is_paused = True
-        self._pause_event.set()
+        self._resume_event.clear()
 
     async def resume_workflow(self) -> None:
         """恢复工作流"""
@@ -274,25 +401,21 @@ class WorkflowController:
         
         self.logger.info("恢复工作流")
         self.is_paused = False
-        self._pause_event.clear()
+        self._resume_event.set()
 
-    async def _task_execution_loop(self) -> None:
-        """任务执行循环"""
+    async def _worker_loop(self) -> None:
+        """任务执行循环，每个工作协程独立从队列取任务"""
         while not self._stop_event.is_set():
             try:
                 # 检查是否暂停
                 if self.is_paused:
-                    await self._pause_event.wait()
+                    await self._resume_event.wait()
                     continue
                 
-                # 获取下一个任务
-                try:
-                    task_id = await asyncio.wait_for(
-                        self.task_queue.get(),
-                        timeout=1.0
-                    )
-                except asyncio.TimeoutError:
-                    continue
+                # 获取下一个任务，停止时立即返回
+                task_id = await self._next_task()
+                if task_id is None:
+                    break
                 
                 # 执行任务
                 await self._execute_task(task_id)
@@ -301,6 +424,20 @@ class WorkflowController:
                 self.logger.error(f"任务执行循环错误: {e}", exc_info=True)
                 await asyncio.sleep(1)
 
+    async def _next_task(self) -> Optional[str]:
+        """等待队列中的下一个任务或停止事件，停止时返回None"""
+        getter = asyncio.ensure_future(self.task_queue.get())
+        stopper = asyncio.ensure_future(self._stop_event.wait())
+        try:
+            await asyncio.wait({getter, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopper.cancel()
+            getter.cancel()
+        
+        if getter.done() and not getter.cancelled():
+            return getter.result()
+        return None
+
     async def _execute_task(self, task_id: str) -> None:
         """执行单个任务"""
         task = self.tasks.get(task_id)
@@ -347,8 +484,8 @@ class WorkflowController:
             
             self.logger.info(f"任务完成: {task.name}")
             
-            # 检查并加入新的就绪任务
-            await self._enqueue_ready_tasks()
+            # 只检查依赖该任务的后继任务
+            self._release_dependents(task_id)
             
         except Exception as e:
             self.logger.error(f"执行任务失败 {task.name}: {e}", exc_info=True)
@@ -364,27 +501,69 @@ class WorkflowController:
                 await self.task_queue.put(task_id)
                 self.logger.info(f"任务重试 {task.name} (第{task.retry_count}次)")
 
-    async def _enqueue_ready_tasks(self) -> None:
+    def _build_dep_graph(self) -> None:
+        """构建反向依赖表和未完成依赖计数，依赖不存在的任务时抛出 ValueError"""
+        _check_dependencies(self.tasks.values(), self.tasks)
+        self._task_ids = []
+        self._task_index = {}
+        self._dependents = []
+        self._deps_remaining = array('i')
+        self._add_to_dep_graph(list(self.tasks.values()))
+        self._graph_ready = True
+
+    def _add_to_dep_graph(self, tasks: List[TaskDefinition]) -> None:
+        """为任务分配下标，并登记其未完成的依赖（依赖必须已在 self.tasks 中）"""
+        for task in tasks:
+            self._task_index[task.id] = len(self._task_ids)
+            self._task_ids.append(task.id)
+            self._dependents.append([])
+            self._deps_remaining.append(0)
+        
+        for task in tasks:
+            index = self._task_index[task.id]
+            count = 0
+            for dep_id in task.dependencies:
+                if self.tasks[dep_id].status != "completed":
+                    count += 1
+                    self._dependents[self._task_index[dep_id]].append(index)
+            self._deps_remaining[index] = count
+
+    def _enqueue_ready_tasks(self) -> None:
         """将准备就绪的任务加入队列"""
-        for task in self.tasks.values():
-            if task.status == "pending" and self._is_task_ready(task):
-                await self.task_queue.put(task.id)
+        deps_remaining = self._deps_remaining
+        for index, task_id in enumerate(self._task_ids):
+            task = self.tasks[task_id]
+            if task.status == "pending" and deps_remaining[index] == 0:
+                self.task_queue.put_nowait(task_id)
                 task.status = "queued"
 
-    def _is_task_ready(self, task: TaskDefinition) -> bool:
-        """检查任务是否准备就绪"""
-        # 检查依赖任务是否都已完成
-        for dep_id in task.dependencies:
-            dep_task = self.tasks.get(dep_id)
-            if not dep_task or dep_task.status != "completed":
-                return False
-        return True
+    def _release_dependents(self, task_id: str) -> None:
+        """任务完成后递减后继任务的依赖计数，计数归零即加入队列"""
+        index = self._task_index.get(task_id)
+        if index is None:
+            return
+        
+        deps_remaining = self._deps_remaining
+        for dep_index in self._dependents[index]:
+            deps_remaining[dep_index] -= 1
+            if deps_remaining[dep_index] == 0:
+                dep_id = self._task_ids[dep_index]
+                task = self.tasks[dep_id]
+                if task.status == "pending":
+                    self.task_queue.put_nowait(dep_id)
+                    task.status = "queued"
 
     def get_workflow_status(self) -> Dict[str, Any]:
         """获取工作流状态"""
         total_tasks = len(self.tasks)
-        completed_tasks = len([t for t in self.tasks.values() if t.status == "completed"])
-        failed_tasks = len([t for t in self.tasks.values() if t.status == "failed"])
+        
+        # 一次遍历同时统计完成和失败的任务
+        completed_tasks = failed_tasks = 0
+        for task in self.tasks.values():
+            if task.status == "completed":
+                completed_tasks += 1
+            elif task.status == "failed":
+                failed_tasks += 1
         
         return {
             "is_running": self.is_running,
@@ -295,11 +295,14 @@ class WorkspaceManager:
             self.current_workspace = config
             self.current_workspace_path = workspace_path
             
-            # 初始化操作记录器
+            # 初始化操作记录器，先关闭上一个工作空间的记录器
+            if self.operation_recorder:
+                await self.operation_recorder.close()
             self.operation_recorder = OperationRecorder(
                 workspace_dir=str(workspace_path),
                 project_id=workspace_id
             )
+            await self.operation_recorder.compress_old_sessions()
             
             self.logger.info(f"加载工作空间: {config.name} ({workspace_id})")
             return config
@@ -4,9 +4,11 @@ Ollama客户端 - 封装Ollama API调用，支持模型配置管理和错误处
 
 import asyncio
 import logging
-from typing import Any, Dict, List, Optional, Union
+import os
+from typing import Any, AsyncGenerator, Dict, List, Optional, Union
 
 import httpx
+import orjson
 from pydantic import BaseModel, Field
 
 
@@ -41,18 +43,25 @@ class OllamaClient:
         host: str = "http://localhost:11434",
         timeout: int = 300,
         max_retries: int = 3,
-        retry_delay: int = 1
+        retry_delay: int = 1,
+        max_parallel: Optional[int] = None
     ):
         self.host = host.rstrip('/')
         self.timeout = timeout
         self.max_retries = max_retries
         self.retry_delay = retry_delay
         self.logger = logging.getLogger("ollama_client")
+
+        # 并发生成请求上限，默认与服务端 OLLAMA_NUM_PARALLEL 保持一致
+        if max_parallel is None:
+            max_parallel = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+        self.max_parallel = max(1, max_parallel)
+        self._request_semaphore = asyncio.Semaphore(self.max_parallel)
         
-        # HTTP客户端配置
+        # HTTP客户端配置（所有请求共享连接池）
         self.client = httpx.AsyncClient(
             timeout=httpx.Timeout(timeout),
-            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5)
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
         )
 
     async def __aenter__(self):
@@ -154,10 +163,11 @@ class OllamaClient:
                 
                 self.logger.debug(f"发送生成请求: model={model}, prompt_length={len(prompt)}")
                 
-                if stream:
-                    return await self._generate_stream(payload)
-                else:
-                    return await self._generate_single(payload)
+                async with self._request_semaphore:
+                    if stream:
+                        return await self._generate_stream(payload)
+                    else:
+                        return await self._generate_single(payload)
                     
             except Exception as e:
                 self.logger.warning(f"生成请求失败 (尝试 {attempt + 1}/{self.max_retries}): {e}")
@@ -166,6 +176,59 @@ class OllamaClient:
                 else:
                     raise
 
+    async def generate_stream(
+        self,
+        model: str,
+        prompt: str,
+        system: Optional[str] = None,
+        options: Optional[Dict[str, Any]] = None
+    ) -> AsyncGenerator[str, None]:
+        """流式生成文本，逐段产出响应内容
+
+        产出第一段内容之前的失败按 generate 相同的策略重试；已产出内容后失败直接抛出。
+        调用方提前结束迭代（并关闭生成器）时会关闭HTTP流，服务端随之停止生成。
+        """
+        payload: Dict[str, Any] = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True
+        }
+        if system:
+            payload["system"] = system
+        if options:
+            payload["options"] = options
+
+        self.logger.debug(f"发送流式生成请求: model={model}, prompt_length={len(prompt)}")
+
+        for attempt in range(self.max_retries):
+            started = False
+            try:
+                async with self._request_semaphore:
+                    async with self.client.stream(
+                        "POST",
+                        f"{self.host}/api/generate",
+                        json=payload
+                    ) as response:
+                        response.raise_for_status()
+
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            data = orjson.loads(line)
+                            chunk = data.get("response")
+                            if chunk:
+                                started = True
+                                yield chunk
+                            if data.get("done", False):
+                                break
+                return
+
+            except Exception as e:
+                if started or attempt >= self.max_retries - 1:
+                    raise
+                self.logger.warning(f"流式生成请求失败 (尝试 {attempt + 1}/{self.max_retries}): {e}")
+                await asyncio.sleep(self.retry_delay * (attempt + 1))
+
     async def _generate_single(self, payload: Dict[str, Any]) -> str:
         """单次生成"""
         response = await self.client.post(
@@ -222,10 +285,11 @@ class OllamaClient:
                 
                 self.logger.debug(f"发送聊天请求: model={model}, messages_count={len(messages)}")
                 
-                if stream:
-                    return await self._chat_stream(payload)
-                else:
-                    return await self._chat_single(payload)
+                async with self._request_semaphore:
+                    if stream:
+                        return await self._chat_stream(payload)
+                    else:
+                        return await self._chat_single(payload)
                     
             except Exception as e:
                 self.logger.warning(f"聊天请求失败 (尝试 {attempt + 1}/{self.max_retries}): {e}")
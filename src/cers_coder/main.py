@@ -171,19 +171,18 @@ class CERSCoder:
             # 初始化操作记录器
             if workspace_manager and workspace_manager.get_current_workspace():
                 workspace_path = workspace_manager.get_current_workspace_path()
-                operation_recorder = OperationRecorder(
+                async with OperationRecorder(
                     workspace_dir=str(workspace_path),
                     project_id=self.current_workspace_id
-                )
-
-                # 记录项目启动操作
-                await operation_recorder.start_operation(
-                    operation_type=OperationType.PROJECT_CREATE,
-                    actor="system",
-                    title="启动项目开发",
-                    description=f"在工作空间中启动项目: {project_name or '未命名项目'}",
-                    input_data={"project_name": project_name, "workspace_id": self.current_workspace_id}
-                )
+                ) as operation_recorder:
+                    # 记录项目启动操作
+                    await operation_recorder.record_instant_operation(
+                        operation_type=OperationType.PROJECT_CREATE,
+                        actor="system",
+                        title="启动项目开发",
+                        description=f"在工作空间中启动项目: {project_name or '未命名项目'}",
+                        input_data={"project_name": project_name, "workspace_id": self.current_workspace_id}
+                    )
 
             self.console.print(Panel.fit("📋 开始项目开发流程", style="bold cyan"))
 
@@ -964,9 +963,10 @@ MIT License
         
         self.is_running = False
         
-        # 停止工作流
+        # 停止工作流并写入未保存的状态
         if self.workflow_controller:
             await self.workflow_controller.stop_workflow()
+            await self.workflow_controller.state_manager.close()
         
         # 停止智能体
         if self.pm_agent:
@@ -978,6 +978,11 @@ MIT License
         if self.ollama_client:
             await self.ollama_client.close()
         
+        # 写入并关闭工作空间的操作记录
+        workspace_manager = self.get_workspace_manager()
+        if workspace_manager and workspace_manager.operation_recorder:
+            await workspace_manager.operation_recorder.close()
+        
         self.console.print("✅ 系统已停止", style="green")
 
     async def resume_project(self, project_id: str) -> bool:
@@ -1380,12 +1385,11 @@ def show(ctx, workspace_id, agent, limit):
 
             # 获取操作记录
             workspace_path = app.workspace_manager.get_current_workspace_path()
-            recorder = OperationRecorder(str(workspace_path), workspace_id or app.current_workspace_id)
-
-            if agent:
-                records_list = await recorder.get_agent_records(agent, workspace_id or app.current_workspace_id)
-            else:
-                records_list = await recorder.get_session_records()
+            async with OperationRecorder(str(workspace_path), workspace_id or app.current_workspace_id) as recorder:
+                if agent:
+                    records_list = await recorder.get_agent_records(agent, workspace_id or app.current_workspace_id)
+                else:
+                    records_list = await recorder.get_session_records()
 
             if not records_list:
                 app.console.print("📭 没有找到操作记录", style="yellow")
@@ -1462,9 +1466,8 @@ def export_records(ctx, workspace_id, output):
 
             # 导出记录
             workspace_path = app.workspace_manager.get_current_workspace_path()
-            recorder = OperationRecorder(str(workspace_path), workspace_id or app.current_workspace_id)
-
-            await recorder.export_records(output, workspace_id or app.current_workspace_id)
+            async with OperationRecorder(str(workspace_path), workspace_id or app.current_workspace_id) as recorder:
+                await recorder.export_records(output, workspace_id or app.current_workspace_id)
 
             app.console.print(f"✅ 操作记录已导出到: {output}")
 
@@ -1637,8 +1640,20 @@ def models(ctx, check_missing, suggest):
     asyncio.run(run())
 
 
+def configure_event_loop() -> None:
+    """安装uvloop事件循环（已安装且非Windows平台时），未安装则使用默认事件循环"""
+    if sys.platform == "win32":
+        return
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
 def main():
     """主入口函数"""
+    configure_event_loop()
     try:
         cli()
     except KeyboardInterrupt:
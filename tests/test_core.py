@@ -3,15 +3,19 @@
 """
 
 import asyncio
+import os
 import pytest
 from datetime import datetime
 from pathlib import Path
 import tempfile
 import json
 
+from src.cers_coder.core.base_agent import AgentConfig, BaseAgent
 from src.cers_coder.core.message import Message, MessageType, MessagePriority
 from src.cers_coder.core.state_manager import StateManager, ProjectState
 from src.cers_coder.core.file_parser import FileParser
+from src.cers_coder.core.operation_recorder import OperationRecorder, OperationStatus, OperationType
+from src.cers_coder.core.workflow import TaskDefinition, WorkflowController, WorkflowPhase, batch_topsort
 
 
 class TestMessage:
@@ -91,6 +95,23 @@ class TestMessage:
         assert new_message.sender == message.sender
         assert new_message.content == message.content
 
+    def test_message_json_serialization(self):
+        """测试消息JSON序列化"""
+        original = Message(
+            type=MessageType.AGENT_REQUEST,
+            sender="agent_a",
+            subject="请求",
+            content={"items": [1, 2, 3]}
+        )
+        reply = original.create_reply(sender="agent_b", subject="回复", content={"ok": True})
+
+        data = reply.to_json()
+        assert isinstance(data, bytes)
+
+        restored = Message.from_json(data)
+        assert restored == reply
+        assert restored.reply_to == original.id
+
 
 class TestStateManager:
     """状态管理器测试"""
@@ -171,6 +192,171 @@ class TestStateManager:
         current_state = state_manager.get_current_state()
         assert current_state.progress == 30.0
     
+    @pytest.mark.asyncio
+    async def test_task_updates_use_delta_log(self, state_manager, temp_dir):
+        """测试任务修改写入增量日志而不重写状态文件"""
+        project = await state_manager.create_project("增量写入测试")
+        state_file = state_manager.state_dir / f"{project.id}.json"
+        mtime_before = state_file.stat().st_mtime_ns
+        
+        for i in range(10):
+            await state_manager.add_task({"id": f"task_{i}"})
+        await state_manager.complete_task("task_0")
+        await state_manager.close()
+        
+        # 状态文件未被重写，修改可以从增量日志中恢复
+        assert state_file.stat().st_mtime_ns == mtime_before
+        loaded = await StateManager(state_dir=temp_dir).load_project(project.id)
+        assert len(loaded.tasks) == 10
+        assert loaded.completed_tasks == ["task_0"]
+        
+        # 压缩后快照包含全部修改
+        assert await state_manager.compact()
+        data = json.loads(state_file.read_text(encoding="utf-8"))
+        assert len(data["tasks"]) == 10
+    
+    @pytest.mark.asyncio
+    async def test_save_state_debounced(self, state_manager, temp_dir, monkeypatch):
+        """测试多次保存请求合并为一次写入，关闭时写入未保存的修改"""
+        project = await state_manager.create_project("测试项目")
+        state_manager.save_interval = 0.05
+        
+        saves = []
+        do_save = state_manager._do_save
+        
+        async def counting_save():
+            saves.append(1)
+            return await do_save()
+        
+        monkeypatch.setattr(state_manager, "_do_save", counting_save)
+        
+        for progress in range(5):
+            project.update_progress(progress * 10.0)
+            assert await state_manager.save_state()
+        assert saves == []
+        await asyncio.sleep(0.2)
+        assert len(saves) == 1
+        
+        # 关闭时立即写入，不等待写入间隔
+        project.update_progress(90.0)
+        await state_manager.save_state()
+        await state_manager.close()
+        assert len(saves) == 2
+        assert state_manager._flush_task is None
+        
+        loaded = await StateManager(state_dir=temp_dir).load_project(project.id)
+        assert loaded.progress == 90.0
+    
+    @pytest.mark.asyncio
+    async def test_restore_checkpoint_discards_later_deltas(self, state_manager, temp_dir):
+        """测试恢复检查点后，检查点之后的增量修改不会在加载时重放"""
+        project = await state_manager.create_project("测试项目")
+        await state_manager.add_task({"id": "t0"})
+        assert await state_manager.create_checkpoint("before")
+        
+        await state_manager.add_task({"id": "t1"})
+        await state_manager.complete_task("t1")
+        assert await state_manager.restore_checkpoint("before")
+        assert [task["id"] for task in state_manager.get_current_state().tasks] == ["t0"]
+        
+        # 恢复后的新修改仍然通过增量日志持久化
+        await state_manager.add_task({"id": "t2"})
+        
+        loaded = await StateManager(state_dir=temp_dir).load_project(project.id)
+        assert [task["id"] for task in loaded.tasks] == ["t0", "t2"]
+        assert loaded.completed_tasks == []
+    
+    @pytest.mark.asyncio
+    async def test_delta_not_replayed_after_queued_flush(self, state_manager, temp_dir):
+        """测试排队中的快照写入与增量修改并发时不会重复重放"""
+        project = await state_manager.create_project("测试项目")
+        await state_manager.add_task({"id": "t0"})
+        
+        # 快照写入先排队等锁，随后到达增量修改
+        await state_manager._save_lock.acquire()
+        state_manager._dirty = True
+        flush = asyncio.create_task(state_manager.flush())
+        await asyncio.sleep(0)
+        add = asyncio.create_task(state_manager.add_task({"id": "t1"}))
+        await asyncio.sleep(0)
+        state_manager._save_lock.release()
+        await asyncio.gather(flush, add)
+        
+        loaded = await StateManager(state_dir=temp_dir).load_project(project.id)
+        assert [task["id"] for task in loaded.tasks] == ["t0", "t1"]
+    
+    @pytest.mark.asyncio
+    async def test_input_files_side_file(self, state_manager, temp_dir):
+        """测试输入文件内容压缩保存到旁路文件"""
+        project = await state_manager.create_project("测试项目")
+        project.input_files = {"README.md": "# 需求\n" * 100}
+        assert await state_manager.compact()
+        
+        state_file = Path(temp_dir) / f"{project.id}.json"
+        data = json.loads(state_file.read_text(encoding="utf-8"))
+        assert "input_files" not in data
+        assert (Path(temp_dir) / data["_input_files"]).exists()
+        
+        loaded = await StateManager(state_dir=temp_dir).load_project(project.id)
+        assert loaded.input_files == project.input_files
+    
+    @pytest.mark.asyncio
+    async def test_in_place_mutations_saved(self, state_manager, temp_dir):
+        """测试直接原地修改的容器字段在保存时不会丢失"""
+        project = await state_manager.create_project("测试项目")
+        project.input_files = {"README.md": "# 需求"}
+        assert await state_manager.compact()
+        
+        project.metadata["owner"] = "tester"
+        project.requirements["functional"] = ["登录"]
+        project.artifacts.append("main.py")
+        project.input_files["API.md"] = "# 接口"
+        await state_manager.save_state()
+        await state_manager.flush()
+        
+        loaded = await StateManager(state_dir=temp_dir).load_project(project.id)
+        assert loaded.metadata["owner"] == "tester"
+        assert loaded.requirements == {"functional": ["登录"]}
+        assert loaded.artifacts == ["main.py"]
+        assert loaded.input_files == {"README.md": "# 需求", "API.md": "# 接口"}
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_keeps_side_files_of_live_projects(self, state_manager, temp_dir):
+        """测试清理按项目整组进行，不删除仍被引用的输入文件"""
+        project = await state_manager.create_project("测试项目")
+        project.input_files = {"README.md": "# 需求"}
+        assert await state_manager.compact()
+        
+        # 输入文件很久未变化，但快照是新的
+        old = datetime.now().timestamp() - 60 * 24 * 3600
+        inputs_file = Path(temp_dir) / f"{project.id}.inputs.json.gz"
+        os.utime(inputs_file, (old, old))
+        project.progress = 50.0
+        assert await state_manager.compact()
+        
+        other = StateManager(state_dir=temp_dir)
+        assert await other.cleanup_old_states(days=30) == 0
+        loaded = await other.load_project(project.id)
+        assert loaded.input_files == project.input_files
+        
+        # 整组文件都过期时一起清理
+        for path in Path(temp_dir).iterdir():
+            os.utime(path, (old, old))
+        assert await StateManager(state_dir=temp_dir).cleanup_old_states(days=30) == 3
+        assert list(Path(temp_dir).iterdir()) == []
+    
+    @pytest.mark.asyncio
+    async def test_load_without_inputs_side_file(self, state_manager, temp_dir):
+        """测试输入文件缺失时仍能加载项目"""
+        project = await state_manager.create_project("测试项目")
+        project.input_files = {"README.md": "# 需求"}
+        assert await state_manager.compact()
+        (Path(temp_dir) / f"{project.id}.inputs.json.gz").unlink()
+        
+        loaded = await StateManager(state_dir=temp_dir).load_project(project.id)
+        assert loaded is not None
+        assert loaded.input_files == {}
+    
     @pytest.mark.asyncio
     async def test_list_projects(self, state_manager):
         """测试项目列表"""
@@ -185,6 +371,12 @@ class TestStateManager:
         project_names = [p["name"] for p in projects]
         assert "项目1" in project_names
         assert "项目2" in project_names
+        
+        # 没有摘要文件的项目从完整状态文件读取
+        for summary_file in state_manager.state_dir.glob("*.summary.json"):
+            summary_file.unlink()
+        projects = await state_manager.list_projects()
+        assert sorted(p["name"] for p in projects) == ["项目1", "项目2"]
 
 
 class TestFileParser:
@@ -240,6 +432,25 @@ class TestFileParser:
         assert "项目名称" in content.sections or "🧱 项目名称" in content.sections
         assert len(content.tables) >= 2  # 智能体表格和输出要求表格
     
+    @pytest.mark.asyncio
+    async def test_parse_markdown_file_cache(self, temp_dir, sample_request_file):
+        """测试文件未变化时复用解析结果"""
+        parser = FileParser(str(temp_dir))
+        first = await parser._parse_markdown_file(sample_request_file)
+        second = await parser._parse_markdown_file(sample_request_file)
+        assert second == first
+
+        # 返回的是副本，修改不影响缓存
+        first.sections.clear()
+        third = await parser._parse_markdown_file(sample_request_file)
+        assert third.sections == second.sections
+        assert third.sections
+
+        # 文件内容变化后重新解析
+        sample_request_file.write_text("# 新标题\n新内容\n", encoding='utf-8')
+        updated = await parser._parse_markdown_file(sample_request_file)
+        assert "新标题" in updated.sections
+
     @pytest.mark.asyncio
     async def test_parse_all_files(self, temp_dir, sample_request_file):
         """测试解析所有文件"""
@@ -280,6 +491,9 @@ class TestFileParser:
 
 ### 标题3
 内容3
+
+## 标题4 ##
+内容4
 """
         
         sections = parser._extract_sections(content)
@@ -287,6 +501,7 @@ class TestFileParser:
         assert "标题1" in sections
         assert "标题2" in sections
         assert "标题3" in sections
+        assert sections["标题4"] == "内容4"
         assert "内容1" in sections["标题1"]
         assert "内容2" in sections["标题2"]
     
@@ -391,5 +606,260 @@ class TestProjectState:
         assert warning["details"]["detail"] == "警告详情"
 
 
+class TestWorkflow:
+    """工作流测试"""
+
+    class StubAgent:
+        name = "stub"
+
+        async def start(self):
+            pass
+
+        async def stop(self):
+            pass
+
+        async def send_message(self, message):
+            pass
+
+    def _task(self, name, dependencies=None):
+        return TaskDefinition(
+            id=name,
+            name=name,
+            description=name,
+            phase=WorkflowPhase.CODING,
+            agent_type="coding_agent",
+            dependencies=dependencies or []
+        )
+
+    def test_batch_topsort(self):
+        """测试按依赖层级分批"""
+        tasks = [
+            self._task("A"),
+            self._task("B"),
+            self._task("C", ["A", "B"]),
+            self._task("D", ["C"]),
+            self._task("E", ["A"]),
+        ]
+
+        waves = batch_topsort(tasks)
+
+        assert [[t.id for t in wave] for wave in waves] == [["A", "B"], ["C", "E"], ["D"]]
+
+    def test_batch_topsort_cycle(self):
+        """测试循环依赖检测"""
+        tasks = [self._task("A", ["B"]), self._task("B", ["A"])]
+
+        with pytest.raises(ValueError):
+            batch_topsort(tasks)
+
+    @pytest.mark.asyncio
+    async def test_release_dependents(self):
+        """测试任务完成后只释放其后继任务"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            controller = WorkflowController(StateManager(temp_dir))
+            for task in [
+                self._task("A"),
+                self._task("B"),
+                self._task("C", ["A", "B"]),
+            ]:
+                controller.tasks[task.id] = task
+            controller._build_dep_graph()
+
+            controller._enqueue_ready_tasks()
+            assert [controller.task_queue.get_nowait() for _ in range(2)] == ["A", "B"]
+
+            controller.tasks["A"].status = "completed"
+            controller._release_dependents("A")
+            assert controller.task_queue.empty()
+
+            controller.tasks["B"].status = "completed"
+            controller._release_dependents("B")
+            assert controller.task_queue.get_nowait() == "C"
+            assert controller.task_queue.empty()
+
+    @pytest.mark.asyncio
+    async def test_register_task_after_start(self):
+        """测试工作流启动后注册的任务会被调度执行"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            controller = WorkflowController(StateManager(temp_dir))
+            controller.register_agent("coding_agent", self.StubAgent())
+            controller.register_task(self._task("A"))
+            await controller.start_workflow()
+            try:
+                controller.register_task(self._task("B", ["A"]))
+                with pytest.raises(ValueError):
+                    controller.register_task(self._task("C", ["missing"]))
+
+                async def wait_completed():
+                    while controller.tasks["B"].status != "completed":
+                        await asyncio.sleep(0.05)
+
+                await asyncio.wait_for(wait_completed(), timeout=5)
+                assert controller.tasks["A"].status == "completed"
+                assert "C" not in controller.tasks
+            finally:
+                await controller.stop_workflow()
+
+    @pytest.mark.asyncio
+    async def test_worker_pool_runs_independent_tasks_concurrently(self):
+        """测试互不依赖的任务并发执行，停止时工作协程立即退出"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            controller = WorkflowController(StateManager(temp_dir), max_parallel=3)
+            controller.register_agent("coding_agent", self.StubAgent())
+            controller.register_tasks([self._task("A"), self._task("B"), self._task("C")])
+
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            await controller.start_workflow()
+            try:
+                async def wait_completed():
+                    while any(t.status != "completed" for t in controller.tasks.values()):
+                        await asyncio.sleep(0.05)
+
+                await asyncio.wait_for(wait_completed(), timeout=5)
+                # 每个任务模拟执行1秒，并发执行时总耗时接近单个任务
+                assert loop.time() - started < 2
+            finally:
+                stopping = loop.time()
+                await controller.stop_workflow()
+                assert loop.time() - stopping < 0.5
+                assert controller._workers == []
+
+    def test_unknown_dependency(self):
+        """测试依赖不存在的任务时两种调度方式都报错"""
+        tasks = [self._task("A"), self._task("B", ["missing"])]
+
+        with pytest.raises(ValueError):
+            batch_topsort(tasks)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            controller = WorkflowController(StateManager(temp_dir))
+            for task in tasks:
+                controller.tasks[task.id] = task
+            with pytest.raises(ValueError):
+                controller._build_dep_graph()
+
+
+class TestBaseAgent:
+    """智能体基类测试"""
+
+    class EchoAgent(BaseAgent):
+        __slots__ = ()
+
+        async def _handle_task_create(self, message):
+            return message.create_reply(sender=self.name, subject="完成", content={})
+
+        async def _handle_agent_request(self, message):
+            return None
+
+    @pytest.mark.asyncio
+    async def test_responses_delivered_to_handler(self):
+        """测试响应直接投递给响应回调，数量不受限制"""
+        agent = self.EchoAgent(AgentConfig(name="echo", description="echo"))
+        received = []
+
+        async def handler(response):
+            received.append(response)
+
+        agent.response_handler = handler
+        await agent.start()
+        try:
+            for i in range(300):
+                await agent.send_message(Message(
+                    type=MessageType.TASK_CREATE,
+                    sender="tester",
+                    subject=f"任务{i}",
+                    content={}
+                ))
+
+            async def wait_all():
+                while len(received) < 300:
+                    await asyncio.sleep(0.01)
+
+            await asyncio.wait_for(wait_all(), timeout=5)
+        finally:
+            await agent.stop()
+
+        assert all(response.receiver == "tester" for response in received)
+
+
+class TestRequirementAgent:
+    """需求分析智能体测试"""
+
+    @pytest.mark.asyncio
+    async def test_deduplicated_owner_cancelled(self):
+        """测试发起方被取消时，共享同一请求的其他调用方不受影响"""
+        from src.cers_coder.agents.requirement_agent import RequirementAgent
+
+        agent = RequirementAgent(ollama_client=None)
+        calls = []
+        release = asyncio.Event()
+
+        async def produce():
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.Event().wait()
+            await release.wait()
+            return "结果"
+
+        owner = asyncio.create_task(agent._deduplicated("key", produce))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(agent._deduplicated("key", produce))
+        await asyncio.sleep(0)
+
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        release.set()
+
+        assert await asyncio.wait_for(waiter, timeout=1) == "结果"
+        assert len(calls) == 2
+        assert agent._get_cached_response("key") == "结果"
+
+
+class TestOperationRecorder:
+    """操作记录器测试"""
+
+    @pytest.fixture
+    def temp_dir(self):
+        """临时目录fixture"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            yield temp_dir
+
+    @pytest.mark.asyncio
+    async def test_get_project_records_by_index(self, temp_dir):
+        """测试通过索引按项目读取记录"""
+        recorder_a = OperationRecorder(temp_dir, project_id="project_a")
+        recorder_b = OperationRecorder(temp_dir, project_id="project_b")
+
+        await recorder_a.record_instant_operation(OperationType.FILE_PARSE, "system", "解析文件")
+        await recorder_b.record_instant_operation(OperationType.FILE_WRITE, "system", "写入文件")
+        await recorder_b.flush()
+
+        records = await recorder_a.get_project_records("project_a")
+        assert records
+        assert all(r.project_id == "project_a" for r in records)
+        assert {r.title for r in records} == {"解析文件"}
+
+        await recorder_a.close()
+        await recorder_b.close()
+
+    @pytest.mark.asyncio
+    async def test_close_persists_active_operations(self, temp_dir):
+        """测试关闭时写入缓冲中的记录，未完成的操作标记为已取消"""
+        recorder = OperationRecorder(temp_dir, project_id="project_a")
+        await recorder.record_instant_operation(OperationType.FILE_PARSE, "system", "解析文件")
+        operation_id = await recorder.start_operation(OperationType.AGENT_PROCESS, "agent", "处理消息")
+        await recorder.close()
+
+        reader = OperationRecorder(temp_dir, project_id="project_a")
+        records = {r.title: r for r in await reader.get_session_records(recorder.session_id)}
+        assert set(records) == {"解析文件", "处理消息"}
+        assert records["处理消息"].id == operation_id
+        assert records["处理消息"].status == OperationStatus.CANCELLED
+        assert not records["处理消息"].success
+        await reader.close()
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])